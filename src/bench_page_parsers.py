@@ -0,0 +1,82 @@
+"""
+Сравнение скорости и результатов разных способов разбора html в PageHandler на корпусе сохраненных страниц.
+
+    python src/bench_page_parsers.py raw_downloads/pages
+    python src/bench_page_parsers.py raw_downloads/pages --parsers html.parser stream --repeat 3
+
+Для каждого парсера выводится пропускная способность в файлах и мегабайтах в секунду, количество файлов, которые
+не удалось обработать, а также количество файлов, текст которых совпадает с эталонным парсером (первым в списке)
+точно и с точностью до пробельных символов. По умолчанию сравниваются только установленные парсеры.
+"""
+import argparse
+import importlib.util
+import tempfile
+import time
+from pathlib import Path
+
+from handlers import PageHandler
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _installed_parsers() -> list[str]:
+    """
+    html.parser и stream есть всегда, а lxml нужно устанавливать отдельно.
+    """
+    return [
+        parser for parser in ("html.parser", "lxml", "stream") if parser != "lxml" or importlib.util.find_spec(parser)
+    ]
+
+
+def run_parser(parser: str, files: list[Path], dest_folder: str, repeat: int) -> tuple[float, dict[str, str], int]:
+    """
+    Возвращает лучшее время из repeat прогонов, извлеченный текст каждого успешно обработанного файла и количество
+    файлов, которые обработать не удалось.
+    """
+    best_time: float = float("inf")
+    outputs: dict[str, str] = {}
+    for _ in range(repeat):
+        outputs = {}
+        started: float = time.perf_counter()
+        for file in files:
+            handler = PageHandler(dest_folder, parser=parser)
+            output_path: str = handler.handle(str(file), file_name=file.name + ".txt")
+            if handler.download_status == "success":
+                outputs[file.name] = output_path
+        best_time = min(best_time, time.perf_counter() - started)
+
+    texts: dict[str, str] = {}
+    for name, output_path in outputs.items():
+        with open(output_path, "r") as output_file:
+            texts[name] = output_file.read()
+    return best_time, texts, len(files) - len(texts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pages_folder")
+    parser.add_argument("--parsers", nargs="+", default=_installed_parsers())
+    parser.add_argument("--repeat", type=int, default=1)
+    args: argparse.Namespace = parser.parse_args()
+
+    files: list[Path] = sorted(Path(args.pages_folder).glob("*.html"))
+    total_mb: float = sum(file.stat().st_size for file in files) / (1024 * 1024)
+    print(f"{len(files)} files, {total_mb:.1f} MB")
+
+    reference: dict[str, str] | None = None
+    print(f"{'parser':<12} {'files/s':>10} {'MB/s':>8} {'failed':>7} {'exact':>7} {'normalized':>11}")
+    for page_parser in args.parsers:
+        with tempfile.TemporaryDirectory() as dest_folder:
+            elapsed, texts, failed = run_parser(page_parser, files, dest_folder, args.repeat)
+
+        reference = reference if reference is not None else texts
+        exact: int = sum(name in texts and texts[name] == text for name, text in reference.items())
+        normalized: int = sum(
+            name in texts and _normalize(texts[name]) == _normalize(text) for name, text in reference.items()
+        )
+        print(
+            f"{page_parser:<12} {len(files) / elapsed:>10.1f} {total_mb / elapsed:>8.2f} "
+            f"{failed:>7} {exact:>7} {normalized:>11}"
+        )
@@ -0,0 +1,147 @@
+from concurrent.futures import Future
+import atexit
+import logging
+import queue
+import threading
+
+import psutil
+from playwright.sync_api import (
+    Browser,
+    Playwright,
+    sync_playwright,
+)
+
+
+class BrowserPool:
+    """
+    Пул долгоживущих браузеров Chromium для рендеринга страниц с динамическим контентом.
+
+    Синхронный API Playwright привязан к потоку, в котором был запущен, поэтому каждый браузер живет в своем
+    потоке-обработчике, а страницы передаются ему через общую очередь. Каждая страница открывается в отдельном
+    контексте, чтобы куки, кэш и localStorage не переходили между URL.
+
+    Браузер перезапускается после max_pages_per_browser страниц или когда суммарная память его процессов превышает
+    max_memory_mb, так как Chromium со временем накапливает память.
+    """
+    def __init__(
+        self,
+        *,
+        size: int = 2,
+        max_pages_per_browser: int = 100,
+        max_memory_mb: int = 1024,
+    ):
+        self.max_pages_per_browser: int = max_pages_per_browser
+        self.max_memory_mb: int = max_memory_mb
+        self._tasks: queue.Queue = queue.Queue()
+        self._launch_lock = threading.Lock()
+        self._threads: list[threading.Thread] = [
+            threading.Thread(target=self._worker, name=f"browser-{i}", daemon=True) for i in range(size)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def render(
+        self,
+        url: str,
+        *,
+        timeout: int | None = None,
+        user_agent: str | None = None,
+    ) -> tuple[str, str]:
+        """
+        Возвращает итоговый URL после редиректов и html-код страницы после выполнения скриптов.
+        """
+        future: Future = Future()
+        self._tasks.put((future, url, timeout, user_agent))
+        return future.result()
+
+    def close(self) -> None:
+        for _ in self._threads:
+            self._tasks.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _worker(self) -> None:
+        try:
+            with self._launch_lock:
+                playwright: Playwright = sync_playwright().start()
+        except Exception as e:
+            logging.error(f"Playwright failed to start: {e}")
+            while (task := self._tasks.get()) is not None:
+                if task[0].set_running_or_notify_cancel():
+                    task[0].set_exception(e)
+            return
+
+        browser: Browser | None = None
+        processes: list[psutil.Process] = []
+        pages: int = 0
+
+        while (task := self._tasks.get()) is not None:
+            future, url, timeout, user_agent = task
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                if browser is None:
+                    browser, processes = self._launch(playwright)
+                    pages = 0
+                context = browser.new_context(user_agent=user_agent)
+                try:
+                    page = context.new_page()
+                    response = page.goto(url, timeout=timeout * 1000 if timeout else 0, wait_until="networkidle")
+                    future.set_result((response.url if response else url, page.content()))
+                finally:
+                    context.close()
+            except Exception as e:
+                future.set_exception(e)
+
+            pages += 1
+            if browser is not None and (
+                pages >= self.max_pages_per_browser or self._memory_mb(processes) >= self.max_memory_mb
+            ):
+                logging.debug(f"Recycling browser after {pages} pages")
+                browser.close()
+                browser = None
+
+        if browser is not None:
+            browser.close()
+        playwright.stop()
+
+    def _launch(self, playwright: Playwright) -> tuple[Browser, list[psutil.Process]]:
+        """
+        Playwright не сообщает PID браузера, поэтому процессы браузера определяются как дочерние процессы, которые
+        появились во время запуска. Запуск выполняется под блокировкой, чтобы не спутать процессы разных браузеров.
+        """
+        current_process = psutil.Process()
+        with self._launch_lock:
+            before: set[int] = {process.pid for process in current_process.children(recursive=True)}
+            browser: Browser = playwright.chromium.launch(headless=True)
+            processes: list[psutil.Process] = [
+                process for process in current_process.children(recursive=True) if process.pid not in before
+            ]
+        return browser, processes
+
+    def _memory_mb(self, processes: list[psutil.Process]) -> float:
+        rss: int = 0
+        seen: set[int] = set()
+        for root in processes:
+            try:
+                for process in (root, *root.children(recursive=True)):
+                    if process.pid not in seen:
+                        seen.add(process.pid)
+                        rss += process.memory_info().rss
+            except psutil.Error:
+                continue
+        return rss / (1024 * 1024)
+
+
+_default_pool: BrowserPool | None = None
+_default_pool_lock = threading.Lock()
+
+
+def get_pool() -> BrowserPool:
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = BrowserPool()
+            atexit.register(_default_pool.close)
+    return _default_pool
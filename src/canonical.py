@@ -0,0 +1,130 @@
+from dataclasses import (
+    dataclass,
+    field,
+)
+from typing import Iterable
+from urllib.parse import (
+    parse_qsl,
+    urlencode,
+    urlsplit,
+    urlunsplit,
+)
+import re
+
+
+"""
+Незначащими query-параметрами являются "*clid" (click id), "utm_*" (UTM-метки), "cache_*" (метки для кэширования) и
+"*_debug" (отладочные).
+"""
+TRACKING_PARAMS: str = r"(^utm_|clid$|^cache_|_debug$)"
+DEFAULT_PORTS: dict[str, int] = {"http": 80, "https": 443, "ftp": 21}
+UNRESERVED: str = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~"
+
+_PERCENT_ESCAPE_RE: re.Pattern = re.compile(r"%[0-9a-fA-F]{2}")
+
+
+@dataclass(kw_only=True)
+class CanonicalizationRules:
+    """
+    Набор правил приведения URL к каноническому виду.
+
+    tracking_params - регулярное выражение для имен query-параметров, которые удаляются у всех хостов.
+    host_tracking_params - дополнительные выражения для отдельных хостов. Правило для "example.com" действует и на
+    его поддомены.
+    case_insensitive_hosts - хосты, у которых путь не зависит от регистра и приводится к нижнему.
+
+    Хосты в правилах, как и хосты канонических URL, приводятся к нижнему регистру и без завершающей точки.
+    """
+    tracking_params: str | None = TRACKING_PARAMS
+    host_tracking_params: dict[str, str] = field(default_factory=dict)
+    case_insensitive_hosts: set[str] = field(default_factory=set)
+    drop_default_port: bool = True
+    drop_fragment: bool = True
+    sort_query: bool = True
+    normalize_percent_encoding: bool = True
+
+    def __post_init__(self):
+        self.host_tracking_params = {
+            host.lower().rstrip("."): pattern for host, pattern in self.host_tracking_params.items()
+        }
+        self.case_insensitive_hosts = {host.lower().rstrip(".") for host in self.case_insensitive_hosts}
+
+
+class URLCanonicalizer:
+    """
+    Приводит URL к каноническому виду, чтобы одинаковые ресурсы, записанные по-разному, скачивались один раз:
+    схема и хост в нижнем регистре, без порта по умолчанию, фрагмента и незначащих query-параметров, с
+    отсортированными query-параметрами и нормализованным percent-encoding в пути.
+
+    Регулярные выражения компилируются один раз при создании, а правила для каждого встреченного хоста собираются
+    один раз и кэшируются, поэтому канонизация больших пакетов URL не повторяет эту работу для каждого URL.
+    """
+    def __init__(self, rules: CanonicalizationRules | None = None):
+        self.rules: CanonicalizationRules = rules or CanonicalizationRules()
+        self._tracking_params: re.Pattern | None = (
+            re.compile(self.rules.tracking_params) if self.rules.tracking_params else None
+        )
+        self._host_tracking_params: dict[str, re.Pattern] = {
+            host: re.compile(pattern) for host, pattern in self.rules.host_tracking_params.items()
+        }
+        self._host_patterns: dict[str, list[re.Pattern]] = {}
+
+    def canonicalize(self, url: str) -> str:
+        parts = urlsplit(url.strip())
+        scheme: str = parts.scheme.lower()
+        host: str = (parts.hostname or "").rstrip(".")
+
+        netloc: str = f"[{host}]" if ":" in host else host
+        try:
+            port: int | None = parts.port
+        except ValueError:
+            port = None
+        if port is not None and not (self.rules.drop_default_port and DEFAULT_PORTS.get(scheme) == port):
+            netloc += f":{port}"
+        if parts.username is not None:
+            userinfo: str = parts.netloc.rpartition("@")[0]
+            netloc = f"{userinfo}@{netloc}"
+
+        path: str = parts.path or "/"
+        if self.rules.normalize_percent_encoding:
+            path = _PERCENT_ESCAPE_RE.sub(_normalize_escape, path)
+        if host in self.rules.case_insensitive_hosts:
+            path = path.lower()
+
+        patterns: list[re.Pattern] = self._patterns_for(host)
+        query_params: list[tuple[str, str]] = [
+            (key, value)
+            for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not any(pattern.search(key) for pattern in patterns)
+        ]
+        if self.rules.sort_query:
+            query_params.sort(key=lambda param: param[0])
+
+        fragment: str = "" if self.rules.drop_fragment else parts.fragment
+        return urlunsplit((scheme, netloc, path, urlencode(query_params, doseq=True), fragment))
+
+    def canonicalize_batch(self, urls: Iterable[str]) -> list[str]:
+        """
+        Повторяющиеся внутри пакета URL канонизируются один раз.
+        """
+        canonical: dict[str, str] = {}
+        return [canonical.get(url) or canonical.setdefault(url, self.canonicalize(url)) for url in urls]
+
+    def _patterns_for(self, host: str) -> list[re.Pattern]:
+        if host not in self._host_patterns:
+            patterns: list[re.Pattern] = [self._tracking_params] if self._tracking_params else []
+            labels: list[str] = host.split(".")
+            for i in range(len(labels)):
+                if (pattern := self._host_tracking_params.get(".".join(labels[i:]))) is not None:
+                    patterns.append(pattern)
+            self._host_patterns[host] = patterns
+        return self._host_patterns[host]
+
+
+def _normalize_escape(match: re.Match) -> str:
+    """
+    Экранированные незарезервированные символы раскодируются, а в остальных последовательностях hex-цифры
+    приводятся к верхнему регистру: "%7e" и "~" - один и тот же путь, как и "%2f" и "%2F".
+    """
+    char: str = chr(int(match.group()[1:], 16))
+    return char if char in UNRESERVED else match.group().upper()
@@ -0,0 +1,67 @@
+from urllib.parse import urlparse
+import mimetypes
+
+
+"""
+Заголовки, по которым нельзя понять формат документа. Для них тип определяется по первым байтам содержимого.
+"""
+GENERIC_MIME_TYPES: tuple[str, ...] = (
+    "application/octet-stream",
+    "application/zip",
+    "application/x-zip-compressed",
+    "binary/octet-stream",
+)
+
+
+def _normalize(content_type: str | None) -> str | None:
+    if not content_type:
+        return None
+    content_type = content_type.split(";")[0].strip().lower()
+    return None if content_type in GENERIC_MIME_TYPES else content_type
+
+
+def sniff(head: bytes) -> str | None:
+    """
+    Определение типа по сигнатуре в начале файла. DocX и XLSX являются zip-архивами, поэтому различаются по именам
+    файлов внутри архива, которые хранятся в заголовках записей в начале файла.
+    """
+    if head.startswith(b"%PDF-"):
+        return "application/pdf"
+    if head.startswith(b"PK\x03\x04"):
+        if b"word/" in head:
+            return "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        if b"xl/" in head:
+            return "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        return None
+
+    text: bytes = head[:1024].lstrip(b"\xef\xbb\xbf \t\r\n").lower()
+    if text.startswith(b"<!doctype html") or any(tag in text for tag in (b"<html", b"<head", b"<body")):
+        return "text/html"
+    return None
+
+
+def detect_content_type(
+    url: str,
+    content_type: str | None = None,
+    head: bytes = b"",
+) -> tuple[str, str]:
+    """
+    Определяет тип контента ("document" или "page") и расширение файла без отдельного запроса.
+    Если заголовок "Content-Type" и расширение в URL согласуются, этого достаточно. Если заголовок отсутствует или
+    неинформативен, тип берется по расширению в URL через mimetypes. При расхождении заголовка и расширения, а также
+    при отсутствии обоих признаков тип определяется по первым байтам тела ответа.
+    """
+    header_type: str | None = _normalize(content_type)
+    url_type: str | None = mimetypes.guess_type(urlparse(url).path)[0]
+
+    if header_type and (url_type is None or header_type == url_type):
+        mime_type: str | None = header_type
+    elif not header_type and url_type:
+        mime_type = url_type
+    else:
+        mime_type = sniff(head) or header_type or url_type
+
+    ext_type: str | None = mimetypes.guess_extension(mime_type) if mime_type else None
+    if ext_type:
+        return "page" if ext_type == ".html" else "document", ext_type
+    return "", ""
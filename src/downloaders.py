@@ -2,18 +2,92 @@ from abc import (
     ABC,
     abstractmethod,
 )
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Literal
+from typing import (
+    AsyncIterable,
+    Iterable,
+    Literal,
+)
+import asyncio
+import itertools
+import hashlib
+import json
+import os
+import re
 import subprocess
 import logging
+import threading
 
-import certifi
+import aiohttp
 import requests
-from playwright.sync_api import sync_playwright
 
+from browser_pool import BrowserPool
+from content_type import detect_content_type
+from http_cache import (
+    CacheEntry,
+    ValidatorCache,
+)
+from ratelimit import HostRateLimiter
+import browser_pool as browser_pool_module
+import http_session
 import robotparser
 
 
+DEFAULT_USER_AGENT: str = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.5735.199 Safari/537.36"
+
+
+class IncompleteDownloadError(Exception):
+    pass
+
+
+class UnsupportedContentTypeError(Exception):
+    pass
+
+
+class ThrottledError(Exception):
+    pass
+
+
+def _parse_content_range(content_range: str | None) -> tuple[int, int | None]:
+    """
+    Разбирает заголовок вида "bytes 100-199/200" и возвращает начальную позицию и общий размер, если он известен.
+    """
+    match = re.fullmatch(r"bytes (\d+)-\d+/(\d+|\*)", (content_range or "").strip())
+    if not match:
+        raise IncompleteDownloadError(f"Invalid Content-Range: {content_range}")
+    total: str = match.group(2)
+    return int(match.group(1)), None if total == "*" else int(total)
+
+
+def _file_hasher(file_path: str):
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        while chunk := file.read(1024 * 1024):
+            hasher.update(chunk)
+    return hasher
+
+
+def _file_hash(file_path: str) -> str:
+    return _file_hasher(file_path).hexdigest()
+
+
+_raw_writer: ThreadPoolExecutor | None = None
+_raw_writer_lock = threading.Lock()
+
+
+def _get_raw_writer() -> ThreadPoolExecutor:
+    """
+    Общий пул потоков для фоновой записи сырых файлов, которые загрузчик держит в памяти. Незавершенные записи
+    дожидаются при выходе из интерпретатора.
+    """
+    global _raw_writer
+    with _raw_writer_lock:
+        if _raw_writer is None:
+            _raw_writer = ThreadPoolExecutor(max_workers=4, thread_name_prefix="raw-writer")
+    return _raw_writer
+
+
 class ContentDownloader(ABC):
     """
     Базовый класс загрузчика, который имеет основной метод download и абстрактный _download.
@@ -22,20 +96,62 @@ class ContentDownloader(ABC):
 
     Однако не учтен момент, что между наследниками и базовым классом нет соглашения о полях self.url и
     self.file_size_bytes.
+
+    Если задан dest_folders, загрузчик сам определяет тип контента по первому ответу и переносит файл в папку этого
+    типа, дописывая к имени файла расширение. Типы, для которых папка не задана, не скачиваются.
+
+    Если задан validator_cache, загрузчик отправляет условный запрос с сохраненными валидаторами и при ответе 304
+    переиспользует ранее скачанный файл.
+
+    Для каждого файла считается SHA-256 содержимого. Если включен content_addressed, файл сохраняется под именем
+    хэша, поэтому одинаковые файлы с разных URL хранятся один раз.
+
+    Если задан rate_limiter, перед каждым запросом загрузчик ждет своей очереди к хосту, а ответы 429 и 503
+    замедляют хост и повторяются после паузы.
+
+    Если задан memory_threshold, ответы не больше memory_threshold байт не пишутся на диск во время загрузки, а
+    собираются в памяти и доступны в self.content, чтобы обработчик не читал файл заново. Сырой файл сохраняется на
+    диск в фоне. Если ответ оказывается больше порога, накопленные данные сбрасываются в .part файл, и загрузка
+    продолжается на диск как обычно.
     """
     def __init__(
         self,
         *,
-        user_agent: str = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.5735.199 Safari/537.36",
+        user_agent: str = DEFAULT_USER_AGENT,
         dest_folder: str = ".",
+        dest_folders: dict[str, str] | None = None,
+        chunk_size: int = 64 * 1024,
+        retries: int = 3,
+        validator_cache: ValidatorCache | None = None,
+        content_addressed: bool = False,
+        rate_limiter: HostRateLimiter | None = None,
+        memory_threshold: int = 0,
     ):
         self.user_agent: str = user_agent
         self.dest_folder: str = dest_folder
+        self.dest_folders: dict[str, str] = dest_folders or {}
+        self.chunk_size: int = chunk_size
+        self.retries: int = retries
+        self.validator_cache: ValidatorCache | None = validator_cache
+        self.content_addressed: bool = content_addressed
+        self.rate_limiter: HostRateLimiter | None = rate_limiter
+        self.memory_threshold: int = memory_threshold
+        self.expected_size: int | None = None
+        self.etag: str | None = None
+        self.last_modified: str | None = None
+        self.from_cache: bool = False
         self.url: str = ""
         self.download_status: Literal["success", "failed_download", "skipped_robots"] = "success"
         self.error_message: str = ""
         self.file_path: str = ""
         self.file_size_bytes: int = 0
+        self.content_type: str = ""
+        self.ext_type: str = ""
+        self.content_hash: str = ""
+        self.content: bytes | None = None
+        self._hasher = hashlib.sha256()
+        self._buffer: bytearray | None = None
+        self._validator: str | None = None
 
     def download(
         self,
@@ -63,12 +179,13 @@ class ContentDownloader(ABC):
                 file_path=file_path,
                 timeout=timeout,
             )
+            self.file_path = self.file_path or file_path
+            self.content_hash = self.content_hash or _file_hash(self.file_path)
         except Exception as e:
             logging.warning(f"Download failed: {e}")
             self.download_status = "failed_download"
             self.error_message = str(e)
 
-        self.file_path = file_path
         return self.file_path
 
     @abstractmethod
@@ -84,27 +201,298 @@ class ContentDownloader(ABC):
         folder.mkdir(parents=True, exist_ok=True)
         return folder
 
+    def _write_chunks(self, chunks: Iterable[bytes], file_path: str) -> None:
+        """
+        Тело ответа дописывается на диск по частям, поэтому в памяти одновременно находится не больше одного чанка.
+        Размер файла считается по фактически записанным байтам, а не по заголовку "Content-Length", который может
+        отсутствовать или не совпадать с реальным размером.
+        """
+        file = None
+        try:
+            for chunk in chunks:
+                file = self._write_chunk(chunk, file_path, file)
+        finally:
+            if file is not None:
+                file.close()
+
+    def _write_chunk(self, chunk: bytes, file_path: str, file):
+        """
+        Пока ответ помещается в memory_threshold, чанки копятся в буфере. Возвращает открытый файл, если запись уже
+        идет на диск.
+        """
+        self._hasher.update(chunk)
+        self.file_size_bytes += len(chunk)
+        if self._buffer is not None:
+            self._buffer += chunk
+            if len(self._buffer) <= self.memory_threshold:
+                return file
+            file = self._create_part(file_path)
+            file.write(self._buffer)
+            self._buffer = None
+            return file
+
+        if file is None:
+            file = open(file_path, "ab")
+        file.write(chunk)
+        return file
+
+    def _create_part(self, part_path: str):
+        with open(part_path + ".json", "w") as file:
+            json.dump({"validator": self._validator}, file)
+        return open(part_path, "wb")
+
+    def _part_path(self, url: str, file_path: str) -> str:
+        """
+        Имя недокачанного файла строится по хэшу URL, а не по имени итогового файла, которое генерируется заново при
+        каждом запуске. Так загрузка продолжится и после перезапуска программы.
+        """
+        return str(Path(file_path).parent / (hashlib.sha1(url.encode()).hexdigest() + ".part"))
+
+    def _request_headers(self, url: str, part_path: str) -> dict[str, str]:
+        """
+        Продолжить загрузку можно только при наличии валидатора, сохраненного при первом ответе. Заголовок
+        "If-Range" гарантирует, что сервер пришлет недостающую часть только если файл не изменился, иначе вернет
+        файл целиком. Сжатие отключается, чтобы позиции в "Range" совпадали с байтами на диске.
+
+        Если недокачанного файла нет, но файл уже скачивался при прошлых запусках, отправляется условный запрос.
+        """
+        headers: dict[str, str] = {"User-Agent": self.user_agent, "Accept-Encoding": "identity"}
+        offset: int = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        try:
+            with open(part_path + ".json", "r") as file:
+                validator: str | None = json.load(file).get("validator")
+        except (OSError, ValueError):
+            validator = None
+
+        if offset and validator:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = validator
+        elif (cache_entry := self._cache_entry(url)) is not None:
+            if cache_entry.etag:
+                headers["If-None-Match"] = cache_entry.etag
+            if cache_entry.last_modified:
+                headers["If-Modified-Since"] = cache_entry.last_modified
+        return headers
+
+    def _cache_entry(self, url: str) -> CacheEntry | None:
+        """
+        Запись из кэша пригодна только если сохраненный файл все еще существует.
+        """
+        if self.validator_cache is None:
+            return None
+        cache_entry: CacheEntry | None = self.validator_cache.get(url)
+        if cache_entry is None or not cache_entry.raw_file_path or not os.path.exists(cache_entry.raw_file_path):
+            return None
+        return cache_entry
+
+    def _use_cached(self, url: str) -> None:
+        cache_entry: CacheEntry = self._cache_entry(url)
+        if cache_entry is None:
+            raise IncompleteDownloadError("Server answered 304 but the cached file is missing")
+
+        logging.info(f"Not modified, reusing {cache_entry.raw_file_path}")
+        self.from_cache = True
+        self.url = cache_entry.final_url or url
+        self.content_type = cache_entry.content_type or ""
+        self.ext_type = cache_entry.ext_type or ""
+        self.file_path = cache_entry.raw_file_path
+        self.file_size_bytes = os.path.getsize(cache_entry.raw_file_path)
+        self.content_hash = cache_entry.content_hash or _file_hash(cache_entry.raw_file_path)
+
+    def _start_part(self, part_path: str, status: int, headers) -> None:
+        """
+        Подготавливает недокачанный файл к записи в зависимости от ответа сервера: при 206 проверяет, что сервер
+        продолжает ровно с той позиции, на которой остановилась загрузка, а при полном ответе начинает загрузку
+        заново и сохраняет валидаторы. Слабый ETag не годится для "If-Range", поэтому в таком случае используется
+        "Last-Modified".
+        """
+        self.etag = headers.get("ETag")
+        self.last_modified = headers.get("Last-Modified")
+        self._buffer = None
+
+        if status == 206:
+            start, total = _parse_content_range(headers.get("Content-Range"))
+            offset: int = os.path.getsize(part_path)
+            if start != offset:
+                self._discard_part(part_path)
+                raise IncompleteDownloadError(f"Server resumed from byte {start} instead of {offset}")
+            self.file_size_bytes = offset
+            self.expected_size = total
+            self._hasher = _file_hasher(part_path)
+            return
+
+        self._validator = self.etag if self.etag and not self.etag.startswith("W/") else self.last_modified
+        content_length: str | None = headers.get("Content-Length")
+        self.file_size_bytes = 0
+        self._hasher = hashlib.sha256()
+        self.expected_size = int(content_length) if content_length and not headers.get("Content-Encoding") else None
+
+        if self.memory_threshold and (self.expected_size is None or self.expected_size <= self.memory_threshold):
+            self._buffer = bytearray()
+        else:
+            self._create_part(part_path).close()
+
+    def _finish_part(self, url: str, part_path: str, file_path: str) -> None:
+        if self.expected_size is not None and self.file_size_bytes != self.expected_size:
+            raise IncompleteDownloadError(f"Received {self.file_size_bytes} of {self.expected_size} bytes")
+        self.content_hash = self._hasher.hexdigest()
+        self.file_path = self._routed_path(file_path)
+        cache_entry = CacheEntry(
+            etag=self.etag,
+            last_modified=self.last_modified,
+            raw_file_path=self.file_path,
+            final_url=self.url,
+            content_type=self.content_type,
+            ext_type=self.ext_type,
+            content_hash=self.content_hash,
+        )
+
+        if self._buffer is None:
+            self._store_part(url, part_path, cache_entry)
+            return
+
+        self.content = bytes(self._buffer)
+        self._buffer = None
+        _get_raw_writer().submit(self._store_content, url, part_path, cache_entry, self.content)
+
+    def _store_content(self, url: str, part_path: str, cache_entry: CacheEntry, content: bytes) -> None:
+        """
+        Фоновая запись ответа, собранного в памяти. Файл пишется через .part, чтобы не оставить на месте сырого файла
+        недописанные данные.
+        """
+        try:
+            if not (self.content_addressed and os.path.exists(cache_entry.raw_file_path)):
+                with open(part_path, "wb") as file:
+                    file.write(content)
+            self._store_part(url, part_path, cache_entry)
+        except Exception as e:
+            logging.error(f"Failed to store {cache_entry.raw_file_path}: {e}")
+
+    def _store_part(self, url: str, part_path: str, cache_entry: CacheEntry) -> None:
+        if self.content_addressed and os.path.exists(cache_entry.raw_file_path):
+            logging.info(f"Identical content is already stored in {cache_entry.raw_file_path}")
+        else:
+            os.replace(part_path, cache_entry.raw_file_path)
+        self._discard_part(part_path)
+
+        if self.validator_cache is not None and (cache_entry.etag or cache_entry.last_modified):
+            self.validator_cache.put(url, cache_entry)
+
+    def _route(self, url: str, headers, head: bytes) -> None:
+        """
+        Тип контента определяется по заголовкам ответа на GET-запрос и первым байтам тела, до загрузки остальной
+        части файла. Отдельный HEAD-запрос не нужен.
+        """
+        self.content_type, self.ext_type = detect_content_type(url, headers.get("Content-Type"), head)
+        if self.dest_folders and self.content_type not in self.dest_folders:
+            raise UnsupportedContentTypeError(f"Unsupported content type: {headers.get('Content-Type')}")
+
+    def _routed_path(self, file_path: str) -> str:
+        if self.content_addressed:
+            file_path = str(Path(file_path).parent / (self.content_hash + Path(file_path).suffix))
+        if not self.dest_folders:
+            return file_path
+        dest_folder: Path = self._mkdir(self.dest_folders[self.content_type])
+        return str(dest_folder / (Path(file_path).name + self.ext_type))
+
+    def _check_throttling(self, url: str, status: int, headers) -> None:
+        if self.rate_limiter is None:
+            return
+        if status in (429, 503):
+            self.rate_limiter.backoff(url, headers.get("Retry-After"))
+            raise ThrottledError(f"Server answered {status}")
+        if status < 400:
+            self.rate_limiter.success(url)
+
+    def _read_head(self, part_path: str) -> bytes:
+        with open(part_path, "rb") as file:
+            return file.read(self.chunk_size)
+
+    def _discard_part(self, part_path: str) -> None:
+        for path in (part_path, part_path + ".json"):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class RequestsContentDownloader(ContentDownloader):
+    """
+    Загрузчик с продолжением прерванных загрузок. Данные пишутся во временный .part файл, и при обрыве соединения
+    загрузка повторяется с места остановки через заголовки "Range"/"If-Range". Итоговый файл появляется только после
+    сверки полученного размера с заявленным сервером.
+
+    По умолчанию запросы идут через общую сессию из http_session, чтобы переиспользовать соединения.
+    """
+    def __init__(
+        self,
+        *,
+        session: requests.Session | None = None,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.session: requests.Session = session or http_session.get_session()
 
-class RequestsDocumentDownloader(ContentDownloader):
     def _download(
         self,
         url: str,
         file_path: str,
         timeout: int | None,
     ) -> None:
-        with requests.get(
+        part_path: str = self._part_path(url, file_path)
+
+        for attempt in range(self.retries + 1):
+            try:
+                self._download_part(url, part_path, timeout)
+                if not self.from_cache:
+                    self._finish_part(url, part_path, file_path)
+                return
+            except (
+                requests.ConnectionError,
+                requests.Timeout,
+                requests.exceptions.ChunkedEncodingError,
+                IncompleteDownloadError,
+                ThrottledError,
+            ) as e:
+                if attempt == self.retries:
+                    raise
+                logging.info(f"Download interrupted, resuming {url}: {e}")
+
+    def _download_part(
+        self,
+        url: str,
+        part_path: str,
+        timeout: int | None,
+    ) -> None:
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(url)
+
+        with self.session.get(
             url,
-            headers={"User-Agent": self.user_agent},
+            headers=self._request_headers(url, part_path),
             timeout=timeout,
-            verify=certifi.where(),
+            stream=True,
         ) as request:
+            self._check_throttling(url, request.status_code, request.headers)
+            if request.status_code == 416:
+                self._discard_part(part_path)
+                raise IncompleteDownloadError("Requested range not satisfiable")
+            if request.status_code == 304:
+                self._use_cached(url)
+                return
             request.raise_for_status()
 
             self.url = request.url
-            self.file_size_bytes = request.headers.get("Content-Length", 0)
+            chunks: Iterable[bytes] = request.iter_content(chunk_size=self.chunk_size)
+            first_chunk: bytes = next(chunks, b"")
+            head: bytes = self._read_head(part_path) if request.status_code == 206 else b""
+            self._route(self.url, request.headers, head + first_chunk)
+
+            self._start_part(part_path, request.status_code, request.headers)
+            self._write_chunks(itertools.chain((first_chunk,), chunks), part_path)
+
+
+class RequestsDocumentDownloader(RequestsContentDownloader):
+    pass
 
-            with open(file_path, "wb") as file:
-                file.write(request.content)
 
 class WgetDocumentDownloader(ContentDownloader):
     def _download(
@@ -116,44 +504,171 @@ class WgetDocumentDownloader(ContentDownloader):
         cmd = ["wget", url, "-O", file_path, "--timeout", str(timeout), "--tries", "3"]
         subprocess.run(cmd, check=True)
 
+        self.url = url
+        self.file_size_bytes = os.path.getsize(file_path)
+
+
+class RequestsPageDownloader(RequestsContentDownloader):
+    pass
+
+
+class PlaywrightPageDownloader(ContentDownloader):
+    """
+    Страницы рендерятся в общем пуле браузеров, поэтому Chromium не запускается заново для каждого URL.
+    """
+    def __init__(
+        self,
+        *,
+        browser_pool: BrowserPool | None = None,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.browser_pool: BrowserPool = browser_pool or browser_pool_module.get_pool()
 
-class RequestsPageDownloader(ContentDownloader):
     def _download(
         self,
         url: str,
         file_path: str,
         timeout: int | None,
     ) -> None:
-        with requests.get(
-            url,
-            headers={"User-Agent": self.user_agent},
-            timeout=timeout,
-            verify=certifi.where(),
-        ) as request:
-            request.raise_for_status()
+        self.url, html = self.browser_pool.render(url, timeout=timeout, user_agent=self.user_agent)
+        content: bytes = html.encode("utf-8")
+        self.file_size_bytes = len(content)
+        if len(content) <= self.memory_threshold:
+            self.content = content
 
-            self.url = request.url
-            self.file_size_bytes = request.headers.get("Content-Length", 0)
+        with open(file_path, "wb") as file:
+            file.write(content)
 
-            with open(file_path, "wb") as file:
-                file.write(request.content)
 
+class AsyncContentDownloader(ContentDownloader):
+    """
+    Асинхронный вариант базового загрузчика. Логика метода download повторяет синхронную версию, но загрузка
+    выполняется в цикле событий, а блокирующие операции (проверка robots.txt, обращения к кэшу валидаторов, хэширование
+    докачиваемого файла, перенос файла в хранилище) выносятся в отдельный поток.
 
-class PlaywrightPageDownloader(ContentDownloader):
-    def _download(
+    Загрузчик не владеет соединениями: сессия с общим пулом соединений передается снаружи и переиспользуется всеми
+    экземплярами.
+    """
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.session: aiohttp.ClientSession = session
+
+    async def download(
+        self,
+        url: str,
+        *,
+        dest_folder: str | None = None,
+        file_name: str | None = None,
+        timeout: int | None = 5,
+    ) -> str:
+        dest_folder: Path = self._mkdir(dest_folder or self.dest_folder)
+        file_name: str = file_name or url.split("/")[-1]
+
+        if not file_name:
+            self.download_status = "failed_download"
+            raise ValueError("The url cannot be empty")
+        if not await asyncio.to_thread(robotparser.can_fetch, url, self.user_agent):
+            logging.warning(f"robots.txt disallows accessing by {url}")
+            self.download_status = "skipped_robots"
+
+        file_path: str = str(dest_folder / file_name)
+        try:
+            logging.info(f"Starting new download {url}")
+            await self._download(
+                url=url,
+                file_path=file_path,
+                timeout=timeout,
+            )
+            self.file_path = self.file_path or file_path
+            self.content_hash = self.content_hash or await asyncio.to_thread(_file_hash, self.file_path)
+        except Exception as e:
+            logging.warning(f"Download failed: {e}")
+            self.download_status = "failed_download"
+            self.error_message = str(e) or type(e).__name__
+
+        return self.file_path
+
+    @abstractmethod
+    async def _download(
+        self,
+        url: str,
+        file_path: str,
+        timeout: int | None,
+    ) -> None: ...
+
+    async def _write_chunks_async(self, chunks: AsyncIterable[bytes], file_path: str) -> None:
+        file = None
+        try:
+            async for chunk in chunks:
+                file = self._write_chunk(chunk, file_path, file)
+        finally:
+            if file is not None:
+                file.close()
+
+
+class AiohttpContentDownloader(AsyncContentDownloader):
+    async def _download(
         self,
         url: str,
         file_path: str,
         timeout: int | None,
     ) -> None:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            response = page.goto(url, timeout=timeout * 1000, wait_until="networkidle")
+        part_path: str = self._part_path(url, file_path)
+
+        for attempt in range(self.retries + 1):
+            try:
+                await self._download_part(url, part_path, timeout)
+                if not self.from_cache:
+                    await asyncio.to_thread(self._finish_part, url, part_path, file_path)
+                return
+            except (
+                aiohttp.ClientConnectionError,
+                aiohttp.ClientPayloadError,
+                asyncio.TimeoutError,
+                IncompleteDownloadError,
+                ThrottledError,
+            ) as e:
+                if attempt == self.retries:
+                    raise
+                logging.info(f"Download interrupted, resuming {url}: {e}")
+
+    async def _download_part(
+        self,
+        url: str,
+        part_path: str,
+        timeout: int | None,
+    ) -> None:
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire_async(url)
+
+        async with self.session.get(
+            url,
+            headers=await asyncio.to_thread(self._request_headers, url, part_path),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout),
+        ) as response:
+            self._check_throttling(url, response.status, response.headers)
+            if response.status == 416:
+                self._discard_part(part_path)
+                raise IncompleteDownloadError("Requested range not satisfiable")
+            if response.status == 304:
+                await asyncio.to_thread(self._use_cached, url)
+                return
+            response.raise_for_status()
 
-            self.url = response.url
-            self.file_size_bytes = response.headers.get("content-length", 0)
+            self.url = str(response.url)
+            first_chunk: bytes = b""
+            while len(first_chunk) < self.chunk_size:
+                if not (data := await response.content.read(self.chunk_size - len(first_chunk))):
+                    break
+                first_chunk += data
+            head: bytes = await asyncio.to_thread(self._read_head, part_path) if response.status == 206 else b""
+            self._route(self.url, response.headers, head + first_chunk)
 
-            with open(file_path, "w") as file:
-                file.write(page.content())
-            browser.close()
+            await asyncio.to_thread(self._start_part, part_path, response.status, response.headers)
+            self._write_chunks((first_chunk,), part_path)
+            await self._write_chunks_async(response.content.iter_chunked(self.chunk_size), part_path)
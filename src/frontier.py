@@ -0,0 +1,146 @@
+from pathlib import Path
+import hashlib
+import math
+import mmap
+import os
+import struct
+import sys
+
+
+class SeenSet:
+    """
+    Точное множество встреченных URL в памяти. Подходит, пока строки всех URL помещаются в память. Интерфейс
+    совпадает с BloomFilter, поэтому их можно подставлять друг вместо друга.
+    """
+    def __init__(self):
+        self._items: set[str] = set()
+        self._items_bytes: int = 0
+
+    @property
+    def count(self) -> int:
+        return len(self._items)
+
+    @property
+    def memory_bytes(self) -> int:
+        return sys.getsizeof(self._items) + self._items_bytes
+
+    def add(self, item: str) -> bool:
+        """
+        Возвращает True, если элемента в множестве еще не было.
+        """
+        if item in self._items:
+            return False
+        self._items.add(item)
+        self._items_bytes += sys.getsizeof(item)
+        return True
+
+    def __contains__(self, item: str) -> bool:
+        return item in self._items
+
+    def close(self) -> None:
+        pass
+
+
+class BloomFilter:
+    """
+    Фильтр Блума для множества уже встреченных URL, когда их слишком много, чтобы хранить в памяти сами строки.
+    Размер битового массива и количество хэш-функций подбираются по ожидаемому количеству элементов capacity и
+    допустимой доле ложных срабатываний error_rate. Ложноотрицательных ответов не бывает, а ложноположительные
+    означают, что новый URL будет принят за уже встречавшийся.
+
+    Если задан file_path, битовый массив отображается в файл через mmap: состояние сохраняется между запусками, а
+    в памяти находятся только используемые страницы файла. Если файл уже существует, параметры фильтра берутся из
+    его заголовка, а переданные capacity и error_rate игнорируются.
+    """
+    MAGIC: bytes = b"URLBLOOM"
+    HEADER: struct.Struct = struct.Struct("<8sQQQdQ")
+
+    def __init__(
+        self,
+        capacity: int,
+        error_rate: float = 0.001,
+        *,
+        file_path: str | None = None,
+    ):
+        if capacity < 1 or not 0 < error_rate < 1:
+            raise ValueError("capacity must be positive and error_rate must be between 0 and 1")
+        self.file_path: str | None = file_path
+        self.count: int = 0
+        self._file = None
+
+        if file_path and os.path.exists(file_path):
+            self._file = open(file_path, "r+b")
+            magic, self.bits, self.hashes, self.capacity, self.error_rate, self.count = self.HEADER.unpack(
+                self._file.read(self.HEADER.size)
+            )
+            if magic != self.MAGIC:
+                raise ValueError(f"{file_path} is not a Bloom filter file")
+        else:
+            self.capacity: int = capacity
+            self.error_rate: float = error_rate
+            self.bits: int = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+            self.hashes: int = max(1, round(self.bits / capacity * math.log(2)))
+            if file_path:
+                Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(file_path, "w+b")
+                self._file.write(self._header())
+                self._file.truncate(self.HEADER.size + self.memory_bytes)
+
+        if self._file is not None:
+            self._array = mmap.mmap(self._file.fileno(), 0)
+            self._offset: int = self.HEADER.size
+        else:
+            self._array = bytearray(self.memory_bytes)
+            self._offset = 0
+
+    @property
+    def memory_bytes(self) -> int:
+        return (self.bits + 7) // 8
+
+    @property
+    def estimated_error_rate(self) -> float:
+        """
+        Ожидаемая доля ложных срабатываний при текущем количестве элементов. Превышает error_rate, если в фильтр
+        добавлено больше capacity элементов.
+        """
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+    def add(self, item: str) -> bool:
+        """
+        Возвращает True, если элемента в фильтре еще не было.
+        """
+        added: bool = False
+        for position in self._positions(item):
+            index: int = self._offset + position // 8
+            mask: int = 1 << position % 8
+            if not self._array[index] & mask:
+                self._array[index] |= mask
+                added = True
+        self.count += added
+        return added
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self._array[self._offset + position // 8] & (1 << position % 8) for position in self._positions(item)
+        )
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        self._array[:self.HEADER.size] = self._header()
+        self._array.flush()
+        self._array.close()
+        self._file.close()
+        self._file = None
+
+    def _positions(self, item: str) -> list[int]:
+        """
+        Двойное хэширование: k позиций получаются из двух независимых половин одного хэша.
+        """
+        digest: bytes = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first: int = int.from_bytes(digest[:8], "little")
+        second: int = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.bits for i in range(self.hashes)]
+
+    def _header(self) -> bytes:
+        return self.HEADER.pack(self.MAGIC, self.bits, self.hashes, self.capacity, self.error_rate, self.count)
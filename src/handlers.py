@@ -2,19 +2,39 @@ from abc import (
     ABC,
     abstractmethod,
 )
+from collections import deque
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+)
+from html.parser import HTMLParser
 from pathlib import Path
-from typing import Literal
+from typing import (
+    BinaryIO,
+    Callable,
+    Iterable,
+    Iterator,
+    Literal,
+)
+import io
+import itertools
 import logging
+import os
 
 from pypdf import (
     PdfReader,
     DocumentInformation,
 )
 from bs4 import BeautifulSoup
-import langdetect
 import docx
 import openpyxl
 
+from language import (
+    TextSampler,
+    detect_language,
+)
+from mp_context import get_mp_context
+
 
 class ContentHandler(ABC):
     """
@@ -23,7 +43,15 @@ class ContentHandler(ABC):
     который обязательно должен быть реализован в наследниках, где способ обработки может быть любым.
 
     Однако не учтен момент, что между наследниками и базовым классом нет соглашения о поле self.metadata.
+
+    Если содержимое файла уже есть в памяти, его можно передать в content, тогда файл с диска не читается, а
+    file_path используется только для имени результата. В _handle в этом случае вместо пути приходит BytesIO.
+
+    version входит в ключ кэша результатов обработки. Его нужно увеличивать при любом изменении обработчика, которое
+    меняет извлеченный текст или метаданные, иначе при повторных запусках будут использоваться старые результаты.
     """
+    version: int = 1
+
     def __init__(self, dest_folder: str = "."):
         self.dest_folder: str = dest_folder
         self.download_status: Literal["success", "failed_processing"] = "success"
@@ -35,6 +63,7 @@ class ContentHandler(ABC):
         self,
         file_path: str,
         *,
+        content: bytes | None = None,
         dest_folder: str | None = None,
         file_name: str | None = None,
     ):
@@ -44,11 +73,11 @@ class ContentHandler(ABC):
 
         try:
             logging.info(f"Starting new processing {file_path}")
-            self._handle(file_path, dest_file_path)
+            self._handle(file_path if content is None else io.BytesIO(content), dest_file_path)
         except Exception as e:
             logging.warning(f"Processing failed: {e}")
             self.download_status = "failed_processing"
-            self.error_message = str(e)
+            self.error_message = str(e) or type(e).__name__
 
         self.path = dest_file_path
         return dest_file_path
@@ -56,7 +85,7 @@ class ContentHandler(ABC):
     @abstractmethod
     def _handle(
         self,
-        file_path: str,
+        source: str | BinaryIO,
         dest_file_path: str,
     ): ...
 
@@ -66,35 +95,124 @@ class ContentHandler(ABC):
         return folder
 
 
+def _open_text(source: str | BinaryIO):
+    return open(source, "r") if isinstance(source, str) else io.TextIOWrapper(source)
+
+
+def _extract_pages(source: str | bytes, start: int, stop: int) -> str:
+    """
+    Функция верхнего уровня, чтобы ее можно было выполнить в другом процессе. Каждый процесс открывает файл сам,
+    так как PdfReader нельзя передать между процессами.
+    """
+    pdf_reader = PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+    return "\n".join(pdf_reader.pages[i].extract_text() for i in range(start, stop))
+
+
 class PDFHandler(ContentHandler):
+    """
+    Большие PDF-файлы делятся на диапазоны по pages_per_range страниц, которые извлекаются параллельно в page_workers
+    процессах и затем собираются в исходном порядке. Деление имеет смысл только для больших файлов, так как запуск
+    процессов и повторный разбор файла в каждом из них стоят дороже, чем извлечение текста из пары десятков страниц.
+    Файл считается большим, если в нем не меньше split_page_threshold страниц или его размер не меньше
+    split_size_threshold байт. Одновременно отправлено в процессы не больше 2 * page_workers диапазонов.
+    """
+    version: int = 1
+
+    def __init__(
+        self,
+        dest_folder: str = ".",
+        *,
+        page_workers: int = min(4, os.cpu_count() or 1),
+        pages_per_range: int = 50,
+        split_page_threshold: int = 200,
+        split_size_threshold: int = 50 * 1024 * 1024,
+    ):
+        super().__init__(dest_folder)
+        self.page_workers: int = page_workers
+        self.pages_per_range: int = pages_per_range
+        self.split_page_threshold: int = split_page_threshold
+        self.split_size_threshold: int = split_size_threshold
+        self._sampler: TextSampler = TextSampler()
+
     def _handle(
         self,
-        file_path: str,
+        source: str | BinaryIO,
         dest_file_path: str,
     ):
-        pdf_reader = PdfReader(file_path)
+        pdf_reader = PdfReader(source)
         metadata: DocumentInformation = pdf_reader.metadata
-        text: str = "\n".join(page.extract_text() for page in pdf_reader.pages)
+        page_count: int = len(pdf_reader.pages)
+        self._sampler = TextSampler()
+
+        if self._should_split(source, page_count):
+            starts: range = range(0, page_count, self.pages_per_range)
+            stops: list[int] = [min(start + self.pages_per_range, page_count) for start in starts]
+            shared_source: str | bytes = source if isinstance(source, str) else source.getvalue()
+            with ProcessPoolExecutor(max_workers=self.page_workers, mp_context=get_mp_context()) as executor:
+                self._write_pages(self._extract_ranges(executor, shared_source, starts, stops), dest_file_path)
+        else:
+            self._write_pages((page.extract_text() for page in pdf_reader.pages), dest_file_path)
 
         creation_date = metadata.creation_date
         self.metadata = {
-            "document_page_count": len(pdf_reader.pages),
+            "document_page_count": page_count,
             "author": metadata.author,
             "creation_date": creation_date.strftime("%Y-%m-%d %H:%M:%S") if creation_date else None,
-            "language": langdetect.detect(text),
         }
+        self.metadata["language"], self.metadata["language_confidence"] = detect_language(self._sampler.text)
+
+    def _extract_ranges(
+        self,
+        executor: ProcessPoolExecutor,
+        source: str | bytes,
+        starts: Iterable[int],
+        stops: Iterable[int],
+    ) -> Iterator[str]:
+        """
+        В отличие от executor.map, который сразу отправляет все диапазоны, новый диапазон отправляется только после
+        того, как текст самого раннего из отправленных отдан на запись. Так в памяти одновременно находятся текст и
+        копия содержимого файла не более чем 2 * page_workers диапазонов, даже если запись отстает от извлечения.
+        """
+        ranges: Iterator[tuple[int, int]] = zip(starts, stops)
+        pending: deque[Future] = deque(
+            executor.submit(_extract_pages, source, start, stop)
+            for start, stop in itertools.islice(ranges, 2 * self.page_workers)
+        )
+        while pending:
+            text: str = pending.popleft().result()
+            for start, stop in itertools.islice(ranges, 1):
+                pending.append(executor.submit(_extract_pages, source, start, stop))
+            yield text
 
+    def _write_pages(self, pages: Iterable[str], dest_file_path: str) -> None:
+        """
+        Текст каждой страницы (или диапазона страниц) записывается в файл сразу после извлечения, а для определения
+        языка сохраняется только ограниченная выборка. Так расход памяти не растет с количеством страниц.
+        """
         with open(dest_file_path, "w") as file:
-            file.write(text)
+            for i, text in enumerate(pages):
+                if i:
+                    file.write("\n")
+                    self._sampler.add("\n")
+                file.write(text)
+                self._sampler.add(text)
+
+    def _should_split(self, source: str | BinaryIO, page_count: int) -> bool:
+        if self.page_workers <= 1 or page_count <= self.pages_per_range:
+            return False
+        size: int = os.path.getsize(source) if isinstance(source, str) else len(source.getvalue())
+        return page_count >= self.split_page_threshold or size >= self.split_size_threshold
 
 
 class DocXHandler(ContentHandler):
+    version: int = 1
+
     def _handle(
         self,
-        file_path: str,
+        source: str | BinaryIO,
         dest_file_path: str,
     ):
-        document = docx.Document(file_path)
+        document = docx.Document(source)
         metadata = document.core_properties
         text: str = "\n".join(paragraph.text for paragraph in document.paragraphs)
 
@@ -103,48 +221,157 @@ class DocXHandler(ContentHandler):
             "document_page_count": len(document.paragraphs),
             "author": metadata.author,
             "creation_date": creation_date.strftime("%Y-%m-%d %H:%M:%S") if creation_date else None,
-            "language": langdetect.detect(text),
         }
+        sampler = TextSampler()
+        sampler.add(text)
+        self.metadata["language"], self.metadata["language_confidence"] = detect_language(sampler.text)
 
         with open(dest_file_path, "w") as file:
             file.write(text)
 
 
 class XLSXHandler(ContentHandler):
+    """
+    В режиме read_only строки читаются лениво и сразу записываются в файл, поэтому книга целиком в памяти не
+    хранится. max_rows_per_sheet и max_cells_per_row ограничивают количество строк листа и ячеек строки, которые
+    попадут в результат. Количество записанных строк возвращается в метаданных как "rows_emitted".
+    """
+    version: int = 1
+
+    def __init__(
+        self,
+        dest_folder: str = ".",
+        *,
+        read_only: bool = True,
+        max_rows_per_sheet: int | None = None,
+        max_cells_per_row: int | None = None,
+    ):
+        super().__init__(dest_folder)
+        self.read_only: bool = read_only
+        self.max_rows_per_sheet: int | None = max_rows_per_sheet
+        self.max_cells_per_row: int | None = max_cells_per_row
+
     def _handle(
         self,
-        file_path: str,
+        source: str | BinaryIO,
         dest_file_path: str,
     ):
-        workbook = openpyxl.load_workbook(file_path, data_only=True)
+        workbook = openpyxl.load_workbook(source, read_only=self.read_only, data_only=True)
         metadata = workbook.properties
-        text: str = "\n".join(
-            " ".join(str(cell) for cell in row if cell is not None)
-            for sheet in workbook.worksheets
-            for row in sheet.iter_rows(values_only=True)
-        )
+        sampler = TextSampler()
+        rows_emitted: int = 0
+
+        try:
+            with open(dest_file_path, "w") as file:
+                for sheet in workbook.worksheets:
+                    for row in itertools.islice(sheet.iter_rows(values_only=True), self.max_rows_per_sheet):
+                        line: str = " ".join(
+                            str(cell) for cell in row[:self.max_cells_per_row] if cell is not None
+                        )
+                        if rows_emitted:
+                            file.write("\n")
+                            sampler.add("\n")
+                        file.write(line)
+                        sampler.add(line)
+                        rows_emitted += 1
+        finally:
+            workbook.close()
 
         creation_date = metadata.created
         self.metadata = {
             "author": metadata.creator,
             "creation_date": creation_date.strftime("%Y-%m-%d %H:%M:%S") if creation_date else None,
-            "language": langdetect.detect(text),
+            "rows_emitted": rows_emitted,
         }
+        self.metadata["language"], self.metadata["language_confidence"] = detect_language(sampler.text)
 
-        with open(dest_file_path, "w") as file:
-            file.write(text)
+
+class _StreamingTextExtractor(HTMLParser):
+    """
+    Извлекает текст из html без построения дерева документа. Текст сразу передается в callback по мере разбора.
+    Как и BeautifulSoup.get_text, пропускает содержимое script, style и template, комментарии и doctype.
+    """
+    SKIPPED_TAGS: tuple[str, ...] = ("script", "style", "template")
+
+    def __init__(self, on_text: Callable[[str], None]):
+        super().__init__(convert_charrefs=True)
+        self.on_text: Callable[[str], None] = on_text
+        self._skip_depth: int = 0
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        if tag in self.SKIPPED_TAGS:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in self.SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data: str) -> None:
+        if not self._skip_depth:
+            self.on_text(data)
 
 
 class PageHandler(ContentHandler):
+    """
+    parser задает способ разбора html:
+    - "html.parser", "lxml", "html5lib" - построители дерева BeautifulSoup. lxml заметно быстрее встроенного
+      html.parser, html5lib медленнее всех, но разбирает страницы так же, как браузер. lxml и html5lib нужно
+      устанавливать отдельно.
+    - "stream" - потоковое извлечение текста без построения дерева. Файл читается кусками по chunk_size символов,
+      текст сразу пишется в результат, поэтому память не зависит от размера страницы.
+    """
+    PARSERS: tuple[str, ...] = ("html.parser", "lxml", "html5lib", "stream")
+    version: int = 1
+
+    def __init__(
+        self,
+        dest_folder: str = ".",
+        *,
+        parser: str = "html.parser",
+        chunk_size: int = 64 * 1024,
+    ):
+        if parser not in self.PARSERS:
+            raise ValueError(f"Unknown parser: {parser}")
+        super().__init__(dest_folder)
+        self.parser: str = parser
+        self.chunk_size: int = chunk_size
+
     def _handle(
         self,
-        file_path: str,
+        source: str | BinaryIO,
+        dest_file_path: str,
+    ):
+        if self.parser == "stream":
+            self._handle_stream(source, dest_file_path)
+            return
+
+        with _open_text(source) as input_file:
+            soup = BeautifulSoup(input_file, self.parser)
+        text: str = soup.get_text()
+        sampler = TextSampler()
+        sampler.add(text)
+
+        language, language_confidence = detect_language(sampler.text)
+        self.metadata = {"language": language, "language_confidence": language_confidence}
+
+        with open(dest_file_path, "w") as output_file:
+            output_file.write(text)
+
+    def _handle_stream(
+        self,
+        source: str | BinaryIO,
         dest_file_path: str,
     ):
-        with open(file_path, "r") as input_file:
-            soup = BeautifulSoup(input_file, "html.parser")
+        sampler = TextSampler()
+        with _open_text(source) as input_file, open(dest_file_path, "w") as output_file:
+            def on_text(text: str) -> None:
+                output_file.write(text)
+                sampler.add(text)
 
-            self.metadata = {"language": langdetect.detect(soup.text)}
+            extractor = _StreamingTextExtractor(on_text)
+            while chunk := input_file.read(self.chunk_size):
+                extractor.feed(chunk)
+            extractor.close()
 
-            with open(dest_file_path, "w") as output_file:
-                output_file.write(soup.text)
+        language, language_confidence = detect_language(sampler.text)
+        self.metadata = {"language": language, "language_confidence": language_confidence}
@@ -0,0 +1,24 @@
+from dataclasses import dataclass
+
+from storage import SQLiteStore
+
+
+@dataclass(kw_only=True)
+class CacheEntry:
+    etag: str | None = None
+    last_modified: str | None = None
+    raw_file_path: str | None = None
+    final_url: str | None = None
+    content_type: str | None = None
+    ext_type: str | None = None
+    content_hash: str | None = None
+
+
+class ValidatorCache(SQLiteStore[CacheEntry]):
+    """
+    Кэш HTTP-валидаторов между запусками. Для каждого URL хранятся ETag, Last-Modified и путь к уже скачанному
+    сырому файлу, чтобы при повторной загрузке отправить условный запрос и при ответе 304 переиспользовать файл.
+    """
+    table = "validators"
+    key = "url"
+    entry_class = CacheEntry
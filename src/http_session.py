@@ -0,0 +1,186 @@
+from dataclasses import (
+    dataclass,
+    replace,
+)
+from typing import Callable
+from urllib.parse import urlparse
+import ssl
+import threading
+
+import certifi
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import (
+    HTTPConnectionPool,
+    HTTPSConnectionPool,
+)
+
+
+@dataclass(kw_only=True)
+class HostConnectionStats:
+    requests: int = 0
+    connections_opened: int = 0
+    tls_sessions_reused: int = 0
+
+
+class _ResumingSSLContext(ssl.SSLContext):
+    """
+    Контекст, который запоминает TLS-сессию последнего соединения с каждым хостом и предлагает ее серверу при
+    следующем соединении. Если сервер принимает сессию, полное рукопожатие с обменом сертификатами не выполняется.
+    urllib3 не позволяет передать сессию при создании соединения, поэтому она подставляется в wrap_socket.
+
+    В TLS 1.2 сессия известна сразу после рукопожатия, а в TLS 1.3 сервер присылает билет сессии уже после него,
+    вместе с первыми данными. Поэтому сессия запоминается еще раз после получения заголовков первого ответа.
+    """
+    def setup(self, on_reused: Callable[[str], None]) -> None:
+        self._sessions: dict[str, ssl.SSLSession] = {}
+        self._sessions_lock = threading.Lock()
+        self._on_reused = on_reused
+
+    def wrap_socket(self, sock, *args, server_hostname: str | None = None, session=None, **kwargs):
+        if session is None and server_hostname:
+            with self._sessions_lock:
+                session = self._sessions.get(server_hostname)
+
+        ssl_socket = super().wrap_socket(sock, *args, server_hostname=server_hostname, session=session, **kwargs)
+
+        self.remember_session(server_hostname, ssl_socket)
+        if server_hostname and ssl_socket.session_reused:
+            self._on_reused(server_hostname)
+        return ssl_socket
+
+    def remember_session(self, server_hostname: str | None, ssl_socket: ssl.SSLSocket) -> None:
+        if not server_hostname:
+            return
+        try:
+            session: ssl.SSLSession | None = ssl_socket.session
+        except (OSError, ValueError):
+            return
+        if session is not None:
+            with self._sessions_lock:
+                self._sessions[server_hostname] = session
+
+
+def _accounting_pool(
+    pool_class: type[HTTPConnectionPool],
+    on_new_connection: Callable[[str], None],
+    ssl_context: _ResumingSSLContext | None = None,
+):
+    class AccountingConnectionPool(pool_class):
+        def _new_conn(self):
+            on_new_connection(self.host)
+            return super()._new_conn()
+
+    if ssl_context is not None:
+        AccountingConnectionPool.ConnectionCls = _resuming_connection(pool_class.ConnectionCls, ssl_context)
+    return AccountingConnectionPool
+
+
+def _resuming_connection(connection_class: type, ssl_context: _ResumingSSLContext) -> type:
+    class ResumingConnection(connection_class):
+        def getresponse(self, *args, **kwargs):
+            """
+            К моменту получения заголовков ответа билет сессии TLS 1.3 уже получен. Сокет берется до вызова, так как
+            если сервер закрывает соединение после ответа, http.client сбрасывает self.sock.
+            """
+            sock = self.sock
+            response = super().getresponse(*args, **kwargs)
+            if isinstance(sock, ssl.SSLSocket):
+                ssl_context.remember_session(getattr(self, "server_hostname", None) or self.host, sock)
+            return response
+    return ResumingConnection
+
+
+class _AccountingAdapter(HTTPAdapter):
+    def __init__(self, session_pool: "SessionPool", **kwargs):
+        """
+        Ссылка на пул сохраняется до вызова конструктора родителя, так как внутри него вызывается init_poolmanager.
+        """
+        self.session_pool: SessionPool = session_pool
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        pool_kwargs["ssl_context"] = self.session_pool.ssl_context
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _accounting_pool(HTTPConnectionPool, self.session_pool.connection_opened),
+            "https": _accounting_pool(
+                HTTPSConnectionPool,
+                self.session_pool.connection_opened,
+                self.session_pool.ssl_context,
+            ),
+        }
+
+
+class SessionPool:
+    """
+    Общая сессия requests с keep-alive соединениями, которую используют загрузчики и проверка robots.txt. Все запросы к одному хосту идут через один пул соединений, поэтому TCP и TLS рукопожатия
+    выполняются только при открытии нового соединения, а TLS-сессии переиспользуются между соединениями.
+
+    pool_connections - количество хостов, пулы которых хранятся одновременно.
+    pool_maxsize - количество соединений, которые хранятся в пуле одного хоста.
+    """
+    def __init__(
+        self,
+        *,
+        pool_connections: int = 100,
+        pool_maxsize: int = 10,
+    ):
+        self._lock = threading.Lock()
+        self._stats: dict[str, HostConnectionStats] = {}
+
+        self.ssl_context: _ResumingSSLContext = _ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        self.ssl_context.load_verify_locations(cafile=certifi.where())
+        self.ssl_context.setup(on_reused=self.tls_session_reused)
+
+        adapter = _AccountingAdapter(self, pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session: requests.Session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.hooks["response"].append(self._count_request)
+
+    def connection_opened(self, host: str) -> None:
+        with self._lock:
+            self._host_stats(host).connections_opened += 1
+
+    def tls_session_reused(self, host: str) -> None:
+        with self._lock:
+            self._host_stats(host).tls_sessions_reused += 1
+
+    def stats(self) -> dict[str, HostConnectionStats]:
+        with self._lock:
+            return {host: replace(host_stats) for host, host_stats in self._stats.items()}
+
+    def _count_request(self, response: requests.Response, *args, **kwargs) -> None:
+        """
+        Хук вызывается для каждого ответа, в том числе для промежуточных ответов при редиректах.
+        """
+        host: str = urlparse(response.url).hostname or ""
+        with self._lock:
+            self._host_stats(host).requests += 1
+
+    def _host_stats(self, host: str) -> HostConnectionStats:
+        return self._stats.setdefault(host.lower(), HostConnectionStats())
+
+
+_default_pool: SessionPool | None = None
+_default_pool_lock = threading.Lock()
+
+
+def configure(**kwargs) -> SessionPool:
+    global _default_pool
+    with _default_pool_lock:
+        _default_pool = SessionPool(**kwargs)
+    return _default_pool
+
+
+def get_pool() -> SessionPool:
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = SessionPool()
+    return _default_pool
+
+
+def get_session() -> requests.Session:
+    return get_pool().session
@@ -0,0 +1,84 @@
+import threading
+
+from langdetect.detector_factory import (
+    DetectorFactory,
+    init_factory,
+)
+from langdetect.lang_detect_exception import LangDetectException
+import langdetect.detector_factory
+
+
+class TextSampler:
+    """
+    Ограниченная по размеру выборка текста для определения языка. Текст добавляется частями по мере извлечения,
+    а в памяти хранится не больше max_chars символов, поэтому весь документ целиком держать не нужно.
+
+    Текст делится на отрезки по segment_chars символов, и в выборку попадает каждый stride-й отрезок. Когда выборка
+    переполняется, из нее убирается каждый второй отрезок, а stride удваивается. Так выборка остается равномерно
+    распределенной по всему документу, хотя его длина заранее неизвестна.
+    """
+    def __init__(self, max_chars: int = 10_000, segment_chars: int = 500):
+        self.max_chars: int = max_chars
+        self.segment_chars: int = segment_chars
+        self._segments: list[str] = []
+        self._current: list[str] = []
+        self._current_size: int = 0
+        self._index: int = 0
+        self._stride: int = 1
+
+    def add(self, text: str) -> None:
+        position: int = 0
+        while position < len(text):
+            stop: int = min(len(text), position + self.segment_chars - self._current_size)
+            if self._index % self._stride == 0:
+                self._current.append(text[position:stop])
+            self._current_size += stop - position
+            position = stop
+            if self._current_size >= self.segment_chars:
+                self._close_segment()
+
+    def _close_segment(self) -> None:
+        if self._index % self._stride == 0:
+            self._segments.append("".join(self._current))
+            if len(self._segments) * self.segment_chars > self.max_chars:
+                self._segments = self._segments[::2]
+                self._stride *= 2
+        self._index += 1
+        self._current = []
+        self._current_size = 0
+
+    @property
+    def text(self) -> str:
+        if self._current:
+            return "\n".join(self._segments + ["".join(self._current)])
+        return "\n".join(self._segments)
+
+
+_factory_lock = threading.Lock()
+
+
+def get_detector_factory() -> DetectorFactory:
+    """
+    Профили языков загружаются один раз на процесс. seed делает результат воспроизводимым: без него langdetect
+    выбирает n-граммы случайно, и на коротких или смешанных текстах язык может отличаться от запуска к запуску.
+    """
+    with _factory_lock:
+        DetectorFactory.seed = 0
+        init_factory()
+    return langdetect.detector_factory._factory
+
+
+def detect_language(text: str) -> tuple[str | None, float | None]:
+    """
+    Возвращает язык текста и его вероятность. Если в тексте нет букв, по которым можно определить язык, возвращает
+    (None, None).
+    """
+    detector = get_detector_factory().create()
+    detector.append(text)
+    try:
+        probabilities = detector.get_probabilities()
+    except LangDetectException:
+        return None, None
+    if not probabilities:
+        return None, None
+    return probabilities[0].lang, round(probabilities[0].prob, 4)
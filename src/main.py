@@ -1,24 +1,39 @@
 import csv
-import re
+import inspect
+import itertools
+import ssl
+import asyncio
 import argparse
-import mimetypes
 import logging
-from dataclasses import asdict
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+)
 
 from urllib.parse import (
     urlparse,
-    parse_qsl,
-    urlunparse,
-    urlencode,
     ParseResult,
 )
-import requests
-from requests.exceptions import RequestException
+import aiohttp
+import certifi
 
+from canonical import URLCanonicalizer
+from frontier import (
+    BloomFilter,
+    SeenSet,
+)
 from downloaders import (
+    DEFAULT_USER_AGENT,
     ContentDownloader,
-    RequestsDocumentDownloader,
-    RequestsPageDownloader,
+    AsyncContentDownloader,
+    AiohttpContentDownloader,
+    RequestsContentDownloader,
 )
 from handlers import (
     ContentHandler,
@@ -27,156 +42,647 @@ from handlers import (
     XLSXHandler,
     PageHandler,
 )
+from http_cache import ValidatorCache
+from processed_index import ProcessedIndex
+from processing import (
+    HandlerResult,
+    init_worker,
+    run_handler,
+)
+from ratelimit import HostRateLimiter
+from report import (
+    REPORT_WRITERS,
+    ReportWriter,
+)
+from sandbox import SandboxPool
+from scheduler import (
+    AsyncSlots,
+    DownloadScheduler,
+    get_host,
+)
 from schemas import URLMetadata
 from logger import configure_logging
+import http_session
 
 
+RAW_FOLDER: str = "raw_downloads/"
 DOCUMENT_RAW_FOLDER: str = "raw_downloads/documents/"
 PAGE_RAW_FOLDER: str = "raw_downloads/pages/"
+RAW_FOLDERS: dict[str, str] = {
+    "document": DOCUMENT_RAW_FOLDER,
+    "page": PAGE_RAW_FOLDER,
+}
 DOCUMENT_PROCESSED_FOLDER: str = "processed_data/documents/"
 PAGE_PROCESSED_FOLDER: str = "processed_data/pages/"
+HANDLERS: dict[str, tuple[type[ContentHandler], str, dict[str, Any]]] = {
+    "pdf": (PDFHandler, DOCUMENT_PROCESSED_FOLDER, {}),
+    "docx": (DocXHandler, DOCUMENT_PROCESSED_FOLDER, {}),
+    "xlsx": (XLSXHandler, DOCUMENT_PROCESSED_FOLDER, {}),
+    "html": (PageHandler, PAGE_PROCESSED_FOLDER, {}),
+}
+
+
+def configure_handler(handler_class: type[ContentHandler], **options: Any) -> None:
+    """
+    Задает именованные аргументы конструктора handler_class для всех типов файлов, которые он обрабатывает. Параметры
+    передаются обработчику и в процессах SandboxPool, так как входят в аргументы run_handler.
+    """
+    for ext_type, (current_class, dest_folder, current_options) in HANDLERS.items():
+        if current_class is handler_class:
+            HANDLERS[ext_type] = (current_class, dest_folder, {**current_options, **options})
+
+
+def extract_urls_from_csv_file(
+    file_name: str,
+    sep: str = ",",
+    *,
+    field_size_limit: int = 16 * 1024 * 1024,
+) -> Iterator[URLMetadata]:
+    """
+    Файл читается построчно модулем csv, поэтому поля в кавычках, содержащие разделитель или перевод строки,
+    разбираются корректно, а URL отдаются по одному по мере чтения и весь файл в памяти не хранится.
 
+    Итерируемся по столбцам на случай, если в строке содержится не одна ссылка или ссылка содержится не в первом
+    столбце. Можно прочитать все столбцы и найти все возможные ссылки.
 
-def extract_urls_from_csv_file(file_name: str, sep: str = ",") -> list[URLMetadata]:
-    urls: list[URLMetadata] = []
+    Строка, которую csv не смог разобрать (например, поле длиннее field_size_limit), пропускается с предупреждением,
+    а чтение продолжается со следующей строки.
+    """
+    csv.field_size_limit(max(csv.field_size_limit(), field_size_limit))
     try:
-        with open(file_name, "r") as file:
-            while row := file.readline():
-                """
-                Итерируемся по столбцам на случай, если в строке содержится не одна ссылка или ссылка содержится не в 
-                первом столбце. Можно прочитать все столбцы и найти все возможные ссылки.
-                
-                Обрезаем " в начале и в конце строки исключительно для случая, когда файл содержит строку такого вида.
-                """
-                for column in row.strip("\n\"").split(sep):
+        with open(file_name, "r", newline="") as file:
+            reader = csv.reader(file, delimiter=sep)
+            while True:
+                try:
+                    row: list[str] = next(reader)
+                except StopIteration:
+                    break
+                except csv.Error as e:
+                    logging.warning(f"Skipping malformed CSV row at line {reader.line_num} of {file_name}: {e}")
+                    continue
+                for column in row:
+                    column = column.strip()
                     parsed_url: ParseResult = urlparse(column)
                     if parsed_url.scheme in ("http", "https", "ftp") and parsed_url.netloc:
-                        urls.append(URLMetadata(source_url=column))
+                        yield URLMetadata(source_url=column)
     except FileNotFoundError:
         logging.warning(f"The file was not found when trying to read the URL list. File: {file_name}")
-    return urls
 
 
-def clear_urls_of_garbage(urls: list[URLMetadata]) -> None:
-    """
-    Используем регулярные выражения для поиска определенных шаблонов, чтобы не перечислять все возможные
-    query-параметры, тем более когда мы можем не знать о существовании некоторых, например "burgerkingclid".
+def canonicalize_urls(
+    urls: Iterable[URLMetadata],
+    canonicalizer: URLCanonicalizer | None = None,
+    *,
+    seen: SeenSet | BloomFilter | None = None,
+    completed: SeenSet | BloomFilter | None = None,
+    batch_size: int = 1000,
+) -> Iterator[URLMetadata]:
     """
-    ignored_query_params_re: str = r"(^utm_|clid$|^cache_|_debug$)"
-    pattern: re.Pattern = re.compile(ignored_query_params_re)
+    URL приводятся к каноническому виду пакетами по batch_size и отдаются дальше по одному. source_url остается
+    исходным, а канонический URL записывается в canonical_url. Если такой канонический URL уже встречался, строка
+    помечается как duplicate еще до загрузки, чтобы один и тот же ресурс не скачивался несколько раз.
 
-    for url in urls:
-        parsed_url = urlparse(url.source_url)
-        query_params = [(key, value) for key, value in parse_qsl(parsed_url.query) if not pattern.search(key)]
-        new_parsed_url = parsed_url._replace(query=urlencode(query_params, doseq=True))
-        url.source_url = str(urlunparse(new_parsed_url))
+    По умолчанию встреченные URL хранятся в памяти точно. Для очень больших входных файлов вместо этого можно
+    передать BloomFilter: тогда небольшая доля новых URL будет ошибочно помечена как duplicate.
 
+    seen заполняется всеми прочитанными URL и должен быть своим для каждого запуска. В completed передается множество
+    URL, успешно обработанных в прошлых запусках: они тоже помечаются как duplicate. URL, которые в прошлый раз не
+    скачались, не обработались или не успели обработаться из-за аварийного завершения, в него не попадают и
+    скачиваются снова.
+    """
+    canonicalizer = canonicalizer or URLCanonicalizer()
+    seen = seen if seen is not None else SeenSet()
+    urls = iter(urls)
+    while batch := list(itertools.islice(urls, batch_size)):
+        for url, canonical_url in zip(batch, canonicalizer.canonicalize_batch(url.source_url for url in batch)):
+            url.canonical_url = canonical_url
+            if completed is not None and canonical_url in completed or not seen.add(canonical_url):
+                url.download_status = "duplicate"
+            yield url
+
+
+def skip_duplicates(
+    urls: Iterable[URLMetadata],
+    on_duplicate: Callable[[URLMetadata], None] | None = None,
+) -> Iterator[URLMetadata]:
+    """
+    Дубликаты не скачиваются, но их обработка на этом завершена, поэтому они сразу передаются в on_duplicate, например,
+    для записи в отчет.
+    """
+    for url in urls:
+        if url.download_status != "duplicate":
+            yield url
+        elif on_duplicate is not None:
+            on_duplicate(url)
 
-def get_content_type(url: str) -> tuple[str, str]:
-    try:
-        response: requests.Response = requests.head(url, allow_redirects=True)
-    except RequestException:
-        logging.warning(f"Attempt to get headers failed {url}")
-    else:
-        """
-        Попытка получить тип контента из заголовка "Content-Type".
-        В случае отсутствия заголовка пытаемся узнать тип контента по URL.
-        """
-        content_type = response.headers.get("Content-Type")
 
-        if not content_type:
-            content_type = mimetypes.guess_type(url)[0]
-        else:
-            content_type = content_type.split(";")[0].strip().lower()
-        ext_type = mimetypes.guess_extension(content_type)
+def _until_stopped(urls: Iterable[URLMetadata], stop: threading.Event | None) -> Iterator[URLMetadata]:
+    for url in urls:
+        if stop is not None and stop.is_set():
+            return
+        yield url
 
-        if ext_type:
-            return "page" if ext_type == ".html" else "document", ext_type
-    return "", ""
 
+def download_file(
+    url: URLMetadata,
+    validator_cache: ValidatorCache | None = None,
+    rate_limiter: HostRateLimiter | None = None,
+    memory_threshold: int = 0,
+) -> bytes | None:
+    """
+    Экземпляры загрузчиков хранят состояние последней загрузки, поэтому для каждого URL создается свой экземпляр.
+    Это позволяет безопасно скачивать файлы из нескольких потоков.
 
-def download_files(urls: list[URLMetadata]) -> None:
-    downloaders: dict[str, ContentDownloader] = {
-        "document": RequestsDocumentDownloader(dest_folder=DOCUMENT_RAW_FOLDER),
-        "page": RequestsPageDownloader(dest_folder=PAGE_RAW_FOLDER),
-    }
+    Тип контента определяет сам загрузчик по ответу на GET-запрос, после чего файл попадает в папку документов или
+    страниц. Для неподдерживаемых типов тело ответа не скачивается.
 
+    Возвращает содержимое файла, если он не больше memory_threshold байт, чтобы передать его обработчику без
+    чтения с диска.
+    """
+    current_downloader: ContentDownloader = RequestsContentDownloader(
+        dest_folder=RAW_FOLDER,
+        dest_folders=RAW_FOLDERS,
+        validator_cache=validator_cache,
+        content_addressed=True,
+        rate_limiter=rate_limiter,
+        memory_threshold=memory_threshold,
+    )
+
+    current_downloader.download(url.canonical_url or url.source_url, file_name=url.id)
+    url.content_type_detected = current_downloader.content_type or None
+    url.final_url = current_downloader.url
+    url.download_status = current_downloader.download_status
+    url.error_message = current_downloader.error_message
+    url.raw_file_path = current_downloader.file_path
+    url.file_size_bytes = current_downloader.file_size_bytes
+    url.served_from_cache = current_downloader.from_cache
+    url.content_hash = current_downloader.content_hash or None
+    return current_downloader.content
+
+
+def download_files(
+    urls: Iterable[URLMetadata],
+    *,
+    workers: int = 16,
+    per_host_limit: int = 2,
+    validator_cache: ValidatorCache | None = None,
+    rate_limiter: HostRateLimiter | None = None,
+    memory_threshold: int = 0,
+    on_downloaded: Callable[[URLMetadata, bytes | None], None] | None = None,
+    stop: threading.Event | None = None,
+) -> None:
     """
     Скачиваем файлы и получаем нужные данные, которые может предоставить интерфейс. 
     В том числе мы получаем данные об успешности/неуспешности попытки скачивания.
+    Загрузки выполняются параллельно с ограничением на общее количество потоков и на количество одновременных
+    загрузок с одного хоста.
+    on_downloaded вызывается в потоке загрузки после каждой загрузки, в том числе неуспешной, и получает содержимое
+    небольших файлов, если оно осталось в памяти.
+    После установки stop новые URL не читаются, а уже прочитанные пропускаются.
     """
-    for url in urls:
-        content_type, ext_type = get_content_type(url.source_url)
+    def task(url: URLMetadata) -> None:
+        if stop is not None and stop.is_set():
+            return
+        try:
+            content: bytes | None = download_file(url, validator_cache, rate_limiter, memory_threshold)
+        except Exception as e:
+            logging.error(f"Scheduled task for {url.source_url} failed: {e}")
+            url.download_status = "failed_download"
+            url.error_message = str(e)
+            content = None
+        if on_downloaded is not None:
+            on_downloaded(url, content)
+
+    scheduler = DownloadScheduler(workers=workers, per_host_limit=per_host_limit)
+    scheduler.run(_until_stopped(urls, stop), task, key=lambda url: get_host(url.canonical_url or url.source_url))
+
+
+async def download_file_async(
+    url: URLMetadata,
+    session: aiohttp.ClientSession,
+    validator_cache: ValidatorCache | None = None,
+    rate_limiter: HostRateLimiter | None = None,
+    memory_threshold: int = 0,
+) -> bytes | None:
+    """
+    Асинхронный аналог download_file.
+    """
+    current_downloader: AsyncContentDownloader = AiohttpContentDownloader(
+        session,
+        dest_folder=RAW_FOLDER,
+        dest_folders=RAW_FOLDERS,
+        validator_cache=validator_cache,
+        content_addressed=True,
+        rate_limiter=rate_limiter,
+        memory_threshold=memory_threshold,
+    )
+
+    await current_downloader.download(url.canonical_url or url.source_url, file_name=url.id)
+    url.content_type_detected = current_downloader.content_type or None
+    url.final_url = current_downloader.url
+    url.download_status = current_downloader.download_status
+    url.error_message = current_downloader.error_message
+    url.raw_file_path = current_downloader.file_path
+    url.file_size_bytes = current_downloader.file_size_bytes
+    url.served_from_cache = current_downloader.from_cache
+    url.content_hash = current_downloader.content_hash or None
+    return current_downloader.content
+
+
+async def download_files_async(
+    urls: Iterable[URLMetadata],
+    *,
+    concurrency: int = 1000,
+    lookahead: int = 10_000,
+    per_host_limit: int = 2,
+    validator_cache: ValidatorCache | None = None,
+    rate_limiter: HostRateLimiter | None = None,
+    memory_threshold: int = 0,
+    on_downloaded: Callable[[URLMetadata, bytes | None], None] | None = None,
+    stop: threading.Event | None = None,
+    slots: AsyncSlots | None = None,
+) -> None:
+    """
+    Все загрузки выполняются в одном цикле событий через общую сессию. Ограничения на общее количество соединений и
+    на количество соединений с одним хостом обеспечивает пул соединений aiohttp: задачи, ожидающие свободного
+    соединения к своему хосту, не занимают слоты других хостов.
+    on_downloaded может блокироваться, поэтому вызывается в отдельном потоке, чтобы не останавливать цикл событий.
 
-        if content_type not in downloaders.keys():
+    URL читаются из urls лениво, и одновременно существует не больше lookahead задач, как и в DownloadScheduler.
+    После установки stop новые URL не читаются, а задачи, еще не начавшие загрузку, пропускаются.
+
+    Если переданы slots, каждая загрузка перед началом занимает слот, а освобождает его тот, кто получает результат
+    в on_downloaded. Ожидание слота периодически проверяет stop, чтобы задачи не зависли, если слоты больше не
+    освободятся.
+    """
+    async def task(url: URLMetadata) -> None:
+        if slots is not None:
+            while not await slots.acquire(timeout=1):
+                if stop is not None and stop.is_set():
+                    return
+        if stop is not None and stop.is_set():
+            return
+        try:
+            content: bytes | None = await download_file_async(
+                url,
+                session,
+                validator_cache,
+                rate_limiter,
+                memory_threshold,
+            )
+        except Exception as e:
+            logging.error(f"Scheduled task for {url.source_url} failed: {e}")
             url.download_status = "failed_download"
-        else:
-            file_name: str = url.id + ext_type
-            current_downloader: ContentDownloader = downloaders.get(content_type)
-
-            url.content_type_detected = content_type
-            current_downloader.download(url.source_url, file_name=file_name)
-            url.final_url = current_downloader.url
-            url.download_status = current_downloader.download_status
-            url.error_message = current_downloader.error_message
-            url.raw_file_path = current_downloader.file_path
-            url.file_size_bytes = current_downloader.file_size_bytes
-
-
-def handle_files(urls: list[URLMetadata]) -> None:
-    handlers: dict[str, ContentHandler] = {
-        "pdf": PDFHandler(dest_folder=DOCUMENT_PROCESSED_FOLDER),
-        "docx": DocXHandler(dest_folder=DOCUMENT_PROCESSED_FOLDER),
-        "xlsx": XLSXHandler(dest_folder=DOCUMENT_PROCESSED_FOLDER),
-        "html": PageHandler(dest_folder=PAGE_PROCESSED_FOLDER),
+            url.error_message = str(e)
+            content = None
+        if on_downloaded is not None:
+            await asyncio.to_thread(on_downloaded, url, content)
+
+    connector = aiohttp.TCPConnector(
+        limit=concurrency,
+        limit_per_host=per_host_limit,
+        ssl=ssl.create_default_context(cafile=certifi.where()),
+    )
+    async with aiohttp.ClientSession(connector=connector) as session:
+        tasks: set[asyncio.Task] = set()
+        for url in _until_stopped(urls, stop):
+            if len(tasks) >= lookahead:
+                _, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            tasks.add(asyncio.create_task(task(url)))
+        if tasks:
+            await asyncio.wait(tasks)
+
+
+def _get_handler(url: URLMetadata) -> tuple[type[ContentHandler], str, dict[str, Any]] | None:
+    ext_type: str = url.raw_file_path.split("/")[-1].split(".")[-1]
+    return HANDLERS.get(ext_type)
+
+
+def _get_handler_options(handler_class: type[ContentHandler], options: dict[str, Any]) -> dict[str, Any]:
+    """
+    Параметры обработчика для ключа индекса обработанных файлов. Параметры, равные значениям по умолчанию
+    конструктора, отбрасываются, поэтому явно заданное значение по умолчанию не приводит к повторной обработке.
+    """
+    defaults: dict[str, Any] = {
+        name: parameter.default for name, parameter in inspect.signature(handler_class).parameters.items()
+    }
+    return {
+        name: value for name, value in options.items() if defaults.get(name, inspect.Parameter.empty) != value
     }
 
+
+def _get_processed_result(url: URLMetadata, processed_index: ProcessedIndex | None) -> HandlerResult | None:
+    """
+    Сырые файлы хранятся по хэшу содержимого, поэтому если файл с таким же хэшем уже был обработан той же версией
+    обработчика с теми же параметрами в этом или в одном из прошлых запусков, результат берется из индекса без повторного извлечения
+    текста.
+    """
+    if processed_index is None or not url.content_hash:
+        return None
+    handler_class, _, options = _get_handler(url)
+    result: tuple[str, dict] | None = processed_index.get_result(
+        url.content_hash,
+        handler_class.__name__,
+        handler_class.version,
+        _get_handler_options(handler_class, options),
+    )
+    if result is None or not os.path.exists(result[0]):
+        return None
+
+    logging.info(f"Already processed {url.raw_file_path}")
+    processed_file_path, metadata = result
+    return HandlerResult(processed_file_path=processed_file_path, metadata=metadata)
+
+
+def _save_processed_result(url: URLMetadata, result: HandlerResult, processed_index: ProcessedIndex | None) -> None:
+    if processed_index is not None and url.content_hash and result.download_status == "success":
+        handler_class, _, options = _get_handler(url)
+        processed_index.put_result(
+            url.content_hash,
+            handler_class.__name__,
+            handler_class.version,
+            result.processed_file_path,
+            result.metadata,
+            _get_handler_options(handler_class, options),
+        )
+
+
+def _apply_processed_result(url: URLMetadata, result: HandlerResult) -> None:
+    ext_type: str = url.raw_file_path.split("/")[-1].split(".")[-1]
+
+    url.download_status = result.download_status
+    url.error_message = result.error_message
+    url.processed_file_path = result.processed_file_path
+    url.detected_language = result.metadata.get("language")
+    url.detected_language_confidence = result.metadata.get("language_confidence")
+    if ext_type in ("pdf", "docx"):
+        url.document_page_count = result.metadata.get("document_page_count")
+        url.metadata_author = result.metadata.get("author")
+        url.metadata_creation_date = result.metadata.get("creation_date")
+    elif ext_type == "xlsx":
+        url.document_row_count = result.metadata.get("rows_emitted")
+        url.metadata_author = result.metadata.get("author")
+        url.metadata_creation_date = result.metadata.get("creation_date")
+
+
+def handle_file(
+    url: URLMetadata,
+    processed_index: ProcessedIndex | None = None,
+    content: bytes | None = None,
+) -> None:
+    """
+    Как и загрузчики, обработчики хранят состояние последней обработки, поэтому для каждого файла создается свой
+    экземпляр.
+    Если content передан, обработчик берет содержимое файла из памяти, а не с диска.
+    """
+    if (handler := _get_handler(url)) is None:
+        url.download_status = "failed_processing"
+        return
+
+    if (result := _get_processed_result(url, processed_index)) is None:
+        handler_class, dest_folder, options = handler
+        result = run_handler(handler_class, dest_folder, url.raw_file_path, content, options)
+        _save_processed_result(url, result, processed_index)
+    _apply_processed_result(url, result)
+
+
+def _process_queue(
+    events: queue.Queue,
+    processed_index: ProcessedIndex | None = None,
+    *,
+    workers: int = 1,
+    task_timeout: float | None = None,
+    cpu_limit: float | None = None,
+    memory_limit_mb: float | None = None,
+    on_processed: Callable[[URLMetadata], None] | None = None,
+) -> None:
+    """
+    Обрабатывает скачанные файлы по мере их появления в очереди events. Элементы очереди - пары из URLMetadata и
+    содержимого файла (или None, если файл нужно читать с диска). None вместо пары означает, что файлов больше
+    не будет. После того как результат обработки применен к URLMetadata, вызывается on_processed.
+
+    При workers > 1 или заданных ограничениях извлечение текста выполняется в изолированных процессах SandboxPool:
+    процесс, который превысил task_timeout, cpu_limit или memory_limit_mb, завершается, а строка помечается как
+    failed_processing с причиной в error_message. Завершенные задачи попадают в ту же очередь events, поэтому
+    ожидание новых файлов и результатов не мешает друг другу. Файлы с одинаковым хэшем обрабатываются один раз.
     """
-    Обрабатываем скачанные файлы и получаем нужные данные, которые может предоставить интерфейс. 
+    on_processed = on_processed or (lambda url: None)
+    if workers <= 1 and task_timeout is None and cpu_limit is None and memory_limit_mb is None:
+        while (event := events.get()) is not None:
+            url, content = event
+            handle_file(url, processed_index, content)
+            on_processed(url)
+        return
+
+    pool = SandboxPool(
+        max(workers, 1),
+        initializer=init_worker,
+        wall_timeout=task_timeout,
+        cpu_limit=cpu_limit,
+        memory_limit_mb=memory_limit_mb,
+    )
+    waiting: dict[str, list[URLMetadata]] = {}
+    finished: dict[str, HandlerResult] = {}
+    in_flight: dict[Future, str] = {}
+
+    producing: bool = True
+    try:
+        while producing or in_flight:
+            event: tuple[URLMetadata, bytes | None] | Future | None = events.get()
+            if event is None:
+                producing = False
+            elif isinstance(event, Future):
+                task_key: str = in_flight.pop(event)
+                try:
+                    result: HandlerResult = event.result()
+                except Exception as e:
+                    logging.warning(f"Processing failed: {e}")
+                    result = HandlerResult(download_status="failed_processing", error_message=str(e))
+                else:
+                    _save_processed_result(waiting[task_key][0], result, processed_index)
+                finished[task_key] = result
+                for url in waiting.pop(task_key):
+                    _apply_processed_result(url, result)
+                    on_processed(url)
+            else:
+                url, content = event
+                task_key: str = url.content_hash or url.raw_file_path
+                if _get_handler(url) is None:
+                    url.download_status = "failed_processing"
+                    on_processed(url)
+                elif task_key in waiting:
+                    waiting[task_key].append(url)
+                elif (result := finished.get(task_key) or _get_processed_result(url, processed_index)) is not None:
+                    finished[task_key] = result
+                    _apply_processed_result(url, result)
+                    on_processed(url)
+                else:
+                    waiting[task_key] = [url]
+                    handler_class, dest_folder, options = _get_handler(url)
+                    future: Future = pool.submit(
+                        run_handler,
+                        handler_class,
+                        dest_folder,
+                        url.raw_file_path,
+                        content,
+                        options,
+                    )
+                    in_flight[future] = task_key
+                    future.add_done_callback(events.put)
+    finally:
+        pool.close()
+
+
+def handle_files(
+    urls: Iterable[URLMetadata],
+    processed_index: ProcessedIndex | None = None,
+    *,
+    workers: int = 1,
+    task_timeout: float | None = None,
+    cpu_limit: float | None = None,
+    memory_limit_mb: float | None = None,
+) -> None:
+    """
+    Обрабатываем скачанные файлы и получаем нужные данные, которые может предоставить интерфейс.
     В том числе мы получаем данные об успешности/неуспешности попытки обработать файл.
     Для каждого типа файла мы получаем отличные от других типов файлов данные, но есть общие, которые мы можем получить
     со всех.
+
+    Если обработка превысила task_timeout секунд, cpu_limit секунд процессорного времени или memory_limit_mb
+    мегабайт памяти, строка помечается как failed_processing.
     """
+    events: queue.Queue = queue.Queue()
     for url in urls:
-        if url.download_status == "failed_download":
-            continue
+        if url.download_status == "success":
+            events.put((url, None))
+    events.put(None)
+    _process_queue(
+        events,
+        processed_index,
+        workers=workers,
+        task_timeout=task_timeout,
+        cpu_limit=cpu_limit,
+        memory_limit_mb=memory_limit_mb,
+    )
+
+
+def download_and_handle_files(
+    urls: Iterable[URLMetadata],
+    processed_index: ProcessedIndex | None = None,
+    *,
+    queue_size: int = 32,
+    use_async: bool = False,
+    workers: int = 16,
+    concurrency: int = 1000,
+    per_host_limit: int = 2,
+    validator_cache: ValidatorCache | None = None,
+    rate_limiter: HostRateLimiter | None = None,
+    memory_threshold: int = 0,
+    process_workers: int = 1,
+    task_timeout: float | None = None,
+    cpu_limit: float | None = None,
+    memory_limit_mb: float | None = None,
+    on_finished: Callable[[URLMetadata], None] | None = None,
+) -> None:
+    """
+    Загрузка и обработка выполняются одновременно: каждый скачанный файл сразу попадает в очередь обработки, пока
+    остальные файлы еще скачиваются. Загрузки идут в отдельном потоке, обработка - в текущем.
 
-        ext_type: str = url.raw_file_path.split("/")[-1].split(".")[-1]
+    Количество скачанных, но еще не обработанных файлов ограничено queue_size. Когда лимит исчерпан, поток загрузки,
+    закончивший скачивание, ждет, пока обработка освободит место, и не берет новые URL. В режиме use_async слот
+    занимается до начала загрузки и ожидается в цикле событий, не занимая потоки, поэтому queue_size ограничивает
+    сумму загружаемых и ожидающих обработки файлов, а значит, и количество одновременных загрузок. Так загрузка не
+    уходит далеко вперед обработки, и на диске не копятся сырые файлы, ожидающие своей очереди.
+
+    Файлы не больше memory_threshold байт передаются обработчику прямо из памяти, а на диск сохраняются в фоне.
+    Память, занятая такими файлами, ограничена величиной queue_size * memory_threshold в режиме use_async и
+    (queue_size + workers) * memory_threshold в режиме потоков: там каждый из workers потоков, закончивших загрузку,
+    держит свой файл, пока ждет места в очереди.
+
+    on_finished вызывается для каждого URL, как только он достиг конечного состояния: после неуспешной загрузки в
+    потоке загрузки, после обработки - в текущем потоке.
+
+    Если обработка прервалась, загрузка перестает брать новые URL и ждет только уже начатые загрузки. Ошибка потока
+    загрузки пробрасывается в текущий поток, чтобы неполные результаты не выглядели как завершенные.
+    """
+    events: queue.Queue = queue.Queue()
+    slots = threading.BoundedSemaphore(queue_size)
+    async_slots = AsyncSlots(queue_size)
+    stopped = threading.Event()
+    errors: list[Exception] = []
 
-        if ext_type not in handlers.keys():
-            url.download_status = "failed_processing"
+    def enqueue(url: URLMetadata, content: bytes | None) -> None:
+        """
+        Если обработка прервалась с ошибкой, место в очереди уже не освободится, поэтому ожидание периодически
+        проверяет stopped, чтобы загрузки не зависли навсегда.
+        """
+        if url.download_status != "success":
+            if use_async:
+                async_slots.release()
+            if on_finished is not None:
+                on_finished(url)
+            return
+        if not use_async:
+            while not slots.acquire(timeout=1):
+                if stopped.is_set():
+                    return
+        events.put((url, content))
+
+    def produce() -> None:
+        try:
+            if use_async:
+                asyncio.run(download_files_async(
+                    urls,
+                    concurrency=concurrency,
+                    per_host_limit=per_host_limit,
+                    validator_cache=validator_cache,
+                    rate_limiter=rate_limiter,
+                    memory_threshold=memory_threshold,
+                    on_downloaded=enqueue,
+                    stop=stopped,
+                    slots=async_slots,
+                ))
+            else:
+                download_files(
+                    urls,
+                    workers=workers,
+                    per_host_limit=per_host_limit,
+                    validator_cache=validator_cache,
+                    rate_limiter=rate_limiter,
+                    memory_threshold=memory_threshold,
+                    on_downloaded=enqueue,
+                    stop=stopped,
+                )
+        except Exception as e:
+            errors.append(e)
+        finally:
+            events.put(None)
+
+    def processed(url: URLMetadata) -> None:
+        if use_async:
+            async_slots.release()
         else:
-            current_handler: ContentHandler = handlers.get(ext_type)
-
-            current_handler.handle(url.raw_file_path)
-            url.download_status = current_handler.download_status
-            url.error_message = current_handler.error_message
-            url.processed_file_path = current_handler.path
-            url.detected_language = current_handler.metadata.get("language")
-            if ext_type in ("pdf", "docx"):
-                url.document_page_count = current_handler.metadata.get("document_page_count")
-                url.metadata_author = current_handler.metadata.get("author")
-                url.metadata_creation_date = current_handler.metadata.get("creation_date")
-            elif ext_type == "xlsx":
-                url.metadata_author = current_handler.metadata.get("author")
-                url.metadata_creation_date = current_handler.metadata.get("creation_date")
-
-
-def generate_csv_report(urls: list[URLMetadata], file_path: str) -> None:
-    """
-    Обработка случая на пустом списке нужна, так как для получения списка названий полей, который нужен для заголовка
-    .csv файла, нужен экземпляр класса, т.е. любой (нулевой) элемент списка.
-    Можно также получить эти поля через __annotations__ или __match_args__, но это не покрывает случай отсутствия
-    аннотаций.
-    """
-    if len(urls) == 0:
-        return
+            slots.release()
+        if on_finished is not None:
+            on_finished(url)
 
-    with open(file_path, "w") as file:
-        writer = csv.DictWriter(file, fieldnames=asdict(urls[0]).keys())
-        writer.writeheader()
-        for url in urls:
-            writer.writerow(asdict(url))
+    producer = threading.Thread(target=produce, name="downloads")
+    producer.start()
+    try:
+        _process_queue(
+            events,
+            processed_index,
+            workers=process_workers,
+            task_timeout=task_timeout,
+            cpu_limit=cpu_limit,
+            memory_limit_mb=memory_limit_mb,
+            on_processed=processed,
+        )
+    finally:
+        stopped.set()
+        producer.join()
+    if errors:
+        raise errors[0]
 
 
 if __name__ == "__main__":
@@ -190,12 +696,157 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
     parser.add_argument("csv_file")
+    parser.add_argument("--workers", type=int, default=16, help="Общее количество потоков загрузки")
+    parser.add_argument("--per-host-limit", type=int, default=2, help="Количество одновременных загрузок с одного хоста")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Скачивать файлы в цикле событий asyncio")
+    parser.add_argument("--concurrency", type=int, default=1000, help="Количество одновременных загрузок в режиме --async")
+    parser.add_argument("--pool-connections", type=int, default=100, help="Количество хостов с пулом соединений")
+    parser.add_argument("--pool-maxsize", type=int, default=10, help="Количество соединений в пуле одного хоста")
+    parser.add_argument(
+        "--validator-cache",
+        default="raw_downloads/validators.sqlite3",
+        help="Файл кэша ETag/Last-Modified для условных запросов, пустая строка отключает кэш",
+    )
+    parser.add_argument(
+        "--crawl-delay",
+        type=float,
+        default=1.0,
+        help="Интервал между запросами к одному хосту в секундах, если в robots.txt нет Crawl-delay/Request-rate",
+    )
+    parser.add_argument(
+        "--max-crawl-delay",
+        type=float,
+        default=300.0,
+        help="Наибольший интервал между запросами к одному хосту в секундах, в том числе из robots.txt",
+    )
+    parser.add_argument(
+        "--processed-index",
+        default="processed_data/index.sqlite3",
+        help="Файл индекса обработанных файлов по хэшу содержимого, пустая строка отключает индекс",
+    )
+    parser.add_argument("--process-workers", type=int, default=1, help="Количество процессов обработки файлов")
+    parser.add_argument("--task-timeout", type=float, default=None, help="Время обработки одного файла в секундах")
+    parser.add_argument("--cpu-limit", type=float, default=None, help="Процессорное время обработки одного файла")
+    parser.add_argument("--memory-limit", type=float, default=None, help="Память процесса обработки в мегабайтах")
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=32,
+        help="Количество скачанных файлов, ожидающих обработки, после которого загрузка приостанавливается",
+    )
+    parser.add_argument(
+        "--seen-filter",
+        default="",
+        help="Файл фильтра Блума встреченных URL, сохраняется между запусками. По умолчанию точное множество в памяти",
+    )
+    parser.add_argument("--seen-capacity", type=int, default=100_000_000, help="Ожидаемое количество URL в фильтре")
+    parser.add_argument("--seen-error-rate", type=float, default=0.001, help="Доля ложных срабатываний фильтра")
+    parser.add_argument(
+        "--memory-threshold",
+        type=int,
+        default=256 * 1024,
+        help="Размер файла в байтах, до которого файл передается обработчику из памяти, 0 отключает",
+    )
+    parser.add_argument(
+        "--report-format",
+        choices=REPORT_WRITERS.keys(),
+        default="csv",
+        help="Формат отчета results_registry, parquet требует pyarrow",
+    )
+    parser.add_argument(
+        "--report-batch-size",
+        type=int,
+        default=None,
+        help="Количество строк отчета, которые копятся в памяти перед записью на диск. По умолчанию зависит от формата",
+    )
+    parser.add_argument(
+        "--page-parser",
+        choices=PageHandler.PARSERS,
+        default="html.parser",
+        help="Парсер HTML-страниц, lxml и html5lib требуют установки одноименных библиотек",
+    )
+    parser.add_argument(
+        "--xlsx-max-rows",
+        type=int,
+        default=None,
+        help="Количество строк каждого листа xlsx, которые попадут в результат. По умолчанию все",
+    )
+    parser.add_argument(
+        "--xlsx-max-cells",
+        type=int,
+        default=None,
+        help="Количество ячеек каждой строки xlsx, которые попадут в результат. По умолчанию все",
+    )
     args: argparse.Namespace = parser.parse_args()
+    http_session.configure(pool_connections=args.pool_connections, pool_maxsize=args.pool_maxsize)
+    configure_handler(PageHandler, parser=args.page_parser)
+    configure_handler(XLSXHandler, max_rows_per_sheet=args.xlsx_max_rows, max_cells_per_row=args.xlsx_max_cells)
 
-    urls: list[URLMetadata] = extract_urls_from_csv_file(args.csv_file)
-    clear_urls_of_garbage(urls)
-
-    download_files(urls)
-    handle_files(urls)
+    """
+    seen нужен только для поиска повторов в текущем входном файле. В сохраняемый между запусками фильтр completed URL
+    попадает, только когда строка со статусом success записана в отчет, чтобы неуспешные и не обработанные из-за
+    аварийного завершения URL скачивались при следующем запуске.
+    """
+    seen: SeenSet | BloomFilter = (
+        BloomFilter(args.seen_capacity, args.seen_error_rate) if args.seen_filter else SeenSet()
+    )
+    completed: BloomFilter | None = (
+        BloomFilter(args.seen_capacity, args.seen_error_rate, file_path=args.seen_filter) if args.seen_filter else None
+    )
+
+    def on_report_flush(rows: list[dict]) -> None:
+        for row in rows:
+            if completed is not None and row["download_status"] == "success":
+                completed.add(row["canonical_url"])
+
+    report_class: type[ReportWriter] = REPORT_WRITERS[args.report_format]
+    report: ReportWriter = report_class(
+        f"results_registry.{report_class.extension}",
+        batch_size=args.report_batch_size,
+        on_flush=on_report_flush,
+    )
+
+    validator_cache: ValidatorCache | None = ValidatorCache(args.validator_cache) if args.validator_cache else None
+    rate_limiter: HostRateLimiter = HostRateLimiter(
+        user_agent=DEFAULT_USER_AGENT,
+        default_interval=args.crawl_delay,
+        max_interval=args.max_crawl_delay,
+    )
+
+    processed_index: ProcessedIndex | None = ProcessedIndex(args.processed_index) if args.processed_index else None
+    download_and_handle_files(
+        skip_duplicates(
+            canonicalize_urls(extract_urls_from_csv_file(args.csv_file), seen=seen, completed=completed),
+            on_duplicate=report.write,
+        ),
+        processed_index,
+        queue_size=args.queue_size,
+        use_async=args.use_async,
+        workers=args.workers,
+        concurrency=args.concurrency,
+        per_host_limit=args.per_host_limit,
+        validator_cache=validator_cache,
+        rate_limiter=rate_limiter,
+        memory_threshold=args.memory_threshold,
+        process_workers=args.process_workers,
+        task_timeout=args.task_timeout,
+        cpu_limit=args.cpu_limit,
+        memory_limit_mb=args.memory_limit,
+        on_finished=report.write,
+    )
+    report.finalize()
+
+    logging.debug(f"Seen {seen.count} unique URLs, seen-set uses {seen.memory_bytes / (1024 * 1024):.1f} MB")
+    if completed is not None:
+        logging.debug(
+            f"Bloom filter holds {completed.count} completed URLs, "
+            f"estimated false positive rate: {completed.estimated_error_rate:.6f}"
+        )
+        completed.close()
+
+    for host, stats in http_session.get_pool().stats().items():
+        logging.debug(
+            f"{host}: {stats.requests} requests, {stats.connections_opened} connections opened, "
+            f"{stats.tls_sessions_reused} TLS sessions reused"
+        )
 
-    generate_csv_report(urls, "results_registry.csv")
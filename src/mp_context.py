@@ -0,0 +1,11 @@
+import multiprocessing
+
+
+def get_mp_context() -> multiprocessing.context.BaseContext:
+    """
+    Процессы обработки создаются, пока в основном процессе работают потоки загрузки и фоновой записи. Дочерний
+    процесс, созданный через fork, может унаследовать захваченную одним из них блокировку и зависнуть, поэтому
+    используется forkserver, а где его нет - spawn.
+    """
+    method: str = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
@@ -0,0 +1,72 @@
+from dataclasses import (
+    dataclass,
+    field,
+)
+from typing import Any
+import json
+
+from storage import SQLiteStore
+
+
+@dataclass(kw_only=True)
+class ProcessedEntry:
+    content_hash: str | None = None
+    handler: str | None = None
+    handler_version: int | None = None
+    processed_file_path: str | None = None
+    metadata: str = field(default="{}")
+
+
+class ProcessedIndex(SQLiteStore[ProcessedEntry]):
+    """
+    Кэш результатов обработки сырых файлов. Ключ записи состоит из хэша содержимого, имени обработчика, его версии и
+    параметров конструктора, поэтому одинаковые файлы, скачанные с разных URL или при прошлых запусках, обрабатываются
+    один раз, а после изменения обработчика (и увеличения его версии) или его параметров обрабатываются заново.
+    Метаданные обработчика хранятся в виде JSON.
+    """
+    table = "processed_results"
+    key = "cache_key"
+    entry_class = ProcessedEntry
+
+    def get_result(
+        self,
+        content_hash: str,
+        handler: str,
+        handler_version: int,
+        handler_options: dict[str, Any] | None = None,
+    ) -> tuple[str, dict] | None:
+        entry: ProcessedEntry | None = self.get(_cache_key(content_hash, handler, handler_version, handler_options))
+        if entry is None:
+            return None
+        return entry.processed_file_path, json.loads(entry.metadata)
+
+    def put_result(
+        self,
+        content_hash: str,
+        handler: str,
+        handler_version: int,
+        processed_file_path: str,
+        metadata: dict,
+        handler_options: dict[str, Any] | None = None,
+    ) -> None:
+        self.put(_cache_key(content_hash, handler, handler_version, handler_options), ProcessedEntry(
+            content_hash=content_hash,
+            handler=handler,
+            handler_version=handler_version,
+            processed_file_path=processed_file_path,
+            metadata=json.dumps(metadata),
+        ))
+
+
+def _cache_key(
+    content_hash: str,
+    handler: str,
+    handler_version: int,
+    handler_options: dict[str, Any] | None = None,
+) -> str:
+    """
+    Обработчик без параметров сохраняет прежний ключ.
+    """
+    if not handler_options:
+        return f"{content_hash}:{handler}:{handler_version}"
+    return f"{content_hash}:{handler}:{handler_version}:{json.dumps(handler_options, sort_keys=True)}"
@@ -0,0 +1,51 @@
+from dataclasses import (
+    dataclass,
+    field,
+)
+from typing import Any
+
+from handlers import ContentHandler
+
+
+@dataclass(kw_only=True)
+class HandlerResult:
+    download_status: str = field(default="success")
+    error_message: str = field(default="")
+    processed_file_path: str = field(default=None)
+    metadata: dict = field(default_factory=dict)
+
+
+def init_worker() -> None:
+    """
+    Выполняется один раз при старте процесса-обработчика. Тяжелые библиотеки импортируются и прогреваются заранее,
+    чтобы первая задача каждого процесса не платила за их загрузку. Профили языков langdetect загружаются с диска
+    при первом определении языка, поэтому загружаются здесь же.
+    """
+    import pypdf
+    import docx
+    import openpyxl
+    import bs4
+    from language import get_detector_factory
+
+    get_detector_factory()
+
+
+def run_handler(
+    handler_class: type[ContentHandler],
+    dest_folder: str,
+    file_path: str,
+    content: bytes | None = None,
+    options: dict[str, Any] | None = None,
+) -> HandlerResult:
+    """
+    Функция верхнего уровня, чтобы ее можно было передать в другой процесс. Возвращает только данные, а не
+    экземпляр обработчика. options - именованные аргументы конструктора обработчика.
+    """
+    current_handler: ContentHandler = handler_class(dest_folder=dest_folder, **(options or {}))
+    current_handler.handle(file_path, content=content)
+    return HandlerResult(
+        download_status=current_handler.download_status,
+        error_message=current_handler.error_message,
+        processed_file_path=current_handler.path,
+        metadata=current_handler.metadata,
+    )
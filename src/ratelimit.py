@@ -0,0 +1,123 @@
+from datetime import (
+    datetime,
+    timezone,
+)
+from email.utils import parsedate_to_datetime
+import asyncio
+import logging
+import threading
+import time
+
+from scheduler import get_host
+import robotparser
+
+
+class TokenBucket:
+    """
+    Токен-бакет с интервалом пополнения interval секунд и емкостью capacity токенов.
+    reserve забирает токен сразу, даже если его еще нет, и возвращает время, через которое этот токен появится.
+    Так вызывающий код сам решает, как ждать: time.sleep в потоке или asyncio.sleep в цикле событий.
+    """
+    def __init__(self, interval: float, capacity: float = 1.0):
+        self.interval: float = interval
+        self.capacity: float = capacity
+        self.tokens: float = capacity
+        self.updated: float = time.monotonic()
+
+    def reserve(self) -> float:
+        if self.interval <= 0:
+            return 0.0
+
+        now: float = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens * self.interval
+
+
+class HostRateLimiter:
+    """
+    Ограничение частоты запросов к каждому хосту. Интервал между запросами берется из директив Crawl-delay и
+    Request-rate в robots.txt, а если их нет, используется default_interval. Интервал из robots.txt ограничен
+    max_interval: иначе хост с "Crawl-delay: 86400" занимал бы потоки загрузки на сутки ради каждого URL.
+
+    При ответах 429 и 503 интервал хоста увеличивается вдвое (но не больше max_interval), а хост блокируется на время
+    из заголовка "Retry-After". После успешных ответов интервал постепенно возвращается к исходному.
+    """
+    def __init__(
+        self,
+        *,
+        user_agent: str,
+        default_interval: float = 1.0,
+        max_interval: float = 300.0,
+    ):
+        self.user_agent: str = user_agent
+        self.default_interval: float = default_interval
+        self.max_interval: float = max_interval
+        self._lock = threading.Lock()
+        self._buckets: dict[str, TokenBucket] = {}
+        self._base_intervals: dict[str, float] = {}
+        self._blocked_until: dict[str, float] = {}
+
+    def reserve(self, url: str) -> float:
+        host: str = get_host(url)
+        if host not in self._base_intervals:
+            """
+            robots.txt загружается вне блокировки, чтобы медленный хост не задерживал остальные.
+            """
+            interval: float | None = robotparser.request_interval(url, self.user_agent)
+            if interval is not None and interval > self.max_interval:
+                logging.warning(
+                    f"{host} requests a {interval} s interval between requests, limiting it to {self.max_interval} s"
+                )
+                interval = self.max_interval
+            with self._lock:
+                self._base_intervals.setdefault(host, self.default_interval if interval is None else interval)
+
+        with self._lock:
+            bucket: TokenBucket = self._buckets.setdefault(host, TokenBucket(self._base_intervals[host]))
+            blocked_for: float = self._blocked_until.get(host, 0.0) - time.monotonic()
+            return max(bucket.reserve(), blocked_for)
+
+    def acquire(self, url: str) -> None:
+        if (delay := self.reserve(url)) > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, url: str) -> None:
+        if (delay := await asyncio.to_thread(self.reserve, url)) > 0:
+            await asyncio.sleep(delay)
+
+    def backoff(self, url: str, retry_after: str | None = None) -> None:
+        host: str = get_host(url)
+        with self._lock:
+            bucket: TokenBucket | None = self._buckets.get(host)
+            if bucket is None:
+                return
+            bucket.interval = min(self.max_interval, max(bucket.interval * 2, 1.0))
+            delay: float = min(self.max_interval, _parse_retry_after(retry_after) or bucket.interval)
+            self._blocked_until[host] = max(self._blocked_until.get(host, 0.0), time.monotonic() + delay)
+
+    def success(self, url: str) -> None:
+        host: str = get_host(url)
+        with self._lock:
+            bucket: TokenBucket | None = self._buckets.get(host)
+            if bucket is not None:
+                bucket.interval = max(self._base_intervals[host], bucket.interval * 0.9)
+
+
+def _parse_retry_after(retry_after: str | None) -> float | None:
+    """
+    Заголовок "Retry-After" содержит либо количество секунд, либо дату в формате HTTP.
+    """
+    if not retry_after:
+        return None
+    retry_after = retry_after.strip()
+    if retry_after.isdigit():
+        return float(retry_after)
+    try:
+        retry_at: datetime = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
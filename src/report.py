@@ -0,0 +1,252 @@
+from abc import (
+    ABC,
+    abstractmethod,
+)
+from dataclasses import fields
+from typing import (
+    Any,
+    Callable,
+    get_origin,
+    get_type_hints,
+)
+import csv
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from scheduler import get_host
+from schemas import URLMetadata
+
+
+REPORT_FIELDS: list[str] = [url_field.name for url_field in fields(URLMetadata)]
+
+
+def _column_type(annotation: Any) -> type:
+    """
+    Тип колонки отчета по аннотации поля URLMetadata: Literal и прочие аннотации хранятся как строки.
+    """
+    if get_origin(annotation) is list:
+        return list
+    if annotation in (int, float, bool):
+        return annotation
+    return str
+
+
+REPORT_COLUMNS: dict[str, type] = {
+    name: _column_type(annotation)
+    for name, annotation in get_type_hints(URLMetadata).items()
+    if name in REPORT_FIELDS
+}
+
+
+class ReportWriter(ABC):
+    """
+    Отчет, который пишется по мере завершения обработки URL, а не одним вызовом в конце работы программы.
+
+    Строки копятся в буфере и дописываются в файл <file_path>.part пакетами по batch_size строк. finalize дописывает
+    остаток и атомарно переименовывает .part в file_path, так что file_path всегда содержит полный отчет.
+    Если при запуске найден .part от прошлого аварийно завершенного запуска, он сохраняется как <file_path>.incomplete
+    вместе со служебными файлами SQLite (-journal, -wal, -shm), без которых незавершенную транзакцию нельзя откатить.
+
+    Колонки берутся из полей URLMetadata и не зависят от содержимого строк, поэтому все форматы отчета имеют одну
+    схему. Запись безопасна из нескольких потоков. Формат файла определяют наследники.
+
+    on_flush вызывается с каждым пакетом строк после того, как он записан на диск.
+    """
+    extension: str
+    default_batch_size: int = 100
+    sidecar_suffixes: tuple[str, ...] = ("-journal", "-wal", "-shm")
+
+    def __init__(
+        self,
+        file_path: str,
+        *,
+        batch_size: int | None = None,
+        on_flush: Callable[[list[dict[str, Any]]], None] | None = None,
+    ):
+        self.file_path: str = file_path
+        self.part_path: str = file_path + ".part"
+        self.batch_size: int = batch_size or self.default_batch_size
+        self.on_flush: Callable[[list[dict[str, Any]]], None] | None = on_flush
+        self.rows_written: int = 0
+        self._lock = threading.Lock()
+        self._buffer: list[dict[str, Any]] = []
+
+        if os.path.exists(self.part_path):
+            logging.warning(f"Found an incomplete report, keeping it as {file_path}.incomplete")
+            os.replace(self.part_path, file_path + ".incomplete")
+        """
+        Служебные файлы переносятся, даже если .part не найден, чтобы они не применились к новому .part.
+        """
+        for suffix in self.sidecar_suffixes:
+            if os.path.exists(self.part_path + suffix):
+                os.replace(self.part_path + suffix, file_path + ".incomplete" + suffix)
+        self._open()
+
+    def write(self, url: URLMetadata) -> None:
+        row: dict[str, Any] = {name: getattr(url, name) for name in REPORT_FIELDS}
+        with self._lock:
+            self._buffer.append(row)
+            if len(self._buffer) >= self.batch_size:
+                self._flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def finalize(self) -> None:
+        with self._lock:
+            self._flush()
+            self._close()
+            os.replace(self.part_path, self.file_path)
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        self._write_rows(self._buffer)
+        self.rows_written += len(self._buffer)
+        if self.on_flush is not None:
+            self.on_flush(self._buffer)
+        self._buffer = []
+
+    @abstractmethod
+    def _open(self) -> None: ...
+
+    @abstractmethod
+    def _write_rows(self, rows: list[dict[str, Any]]) -> None: ...
+
+    @abstractmethod
+    def _close(self) -> None: ...
+
+
+class CSVReportWriter(ReportWriter):
+    """
+    При аварийном завершении программы .part содержит все строки, кроме последнего неполного пакета.
+    """
+    extension: str = "csv"
+
+    def _open(self) -> None:
+        self._file = open(self.part_path, "w", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=REPORT_FIELDS)
+        self._writer.writeheader()
+        self._file.flush()
+
+    def _write_rows(self, rows: list[dict[str, Any]]) -> None:
+        self._writer.writerows(rows)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _close(self) -> None:
+        self._file.close()
+
+
+class JSONLReportWriter(ReportWriter):
+    """
+    Одна строка - один JSON-объект. В отличие от CSV, списки и типы значений сохраняются без потерь.
+    """
+    extension: str = "jsonl"
+
+    def _open(self) -> None:
+        self._file = open(self.part_path, "w", encoding="utf-8")
+
+    def _write_rows(self, rows: list[dict[str, Any]]) -> None:
+        self._file.writelines(json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in rows)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _close(self) -> None:
+        self._file.close()
+
+
+class ParquetReportWriter(ReportWriter):
+    """
+    Колоночный формат для аналитики. Каждый пакет строк записывается отдельной группой строк (row group), поэтому
+    пакеты по умолчанию крупнее, чем у других форматов. Метаданные Parquet пишутся в конец файла при finalize, так что
+    .part аварийно завершенного запуска прочитать нельзя.
+
+    Нужна библиотека pyarrow, она не входит в обязательные зависимости.
+    """
+    extension: str = "parquet"
+    default_batch_size: int = 10_000
+
+    def _open(self) -> None:
+        import pyarrow
+        import pyarrow.parquet
+
+        types: dict[type, Any] = {
+            str: pyarrow.string(),
+            int: pyarrow.int64(),
+            float: pyarrow.float64(),
+            bool: pyarrow.bool_(),
+            list: pyarrow.list_(pyarrow.string()),
+        }
+        self._pyarrow = pyarrow
+        self._schema = pyarrow.schema([(name, types[column]) for name, column in REPORT_COLUMNS.items()])
+        self._writer = pyarrow.parquet.ParquetWriter(self.part_path, self._schema)
+
+    def _write_rows(self, rows: list[dict[str, Any]]) -> None:
+        """
+        Строковые колонки приводятся к str, так как pyarrow не преобразует типы сам.
+        """
+        for row in rows:
+            for name, column in REPORT_COLUMNS.items():
+                if column is str and row[name] is not None:
+                    row[name] = str(row[name])
+        self._writer.write_table(self._pyarrow.Table.from_pylist(rows, schema=self._schema))
+
+    def _close(self) -> None:
+        self._writer.close()
+
+
+class SQLiteReportWriter(ReportWriter):
+    """
+    Таблица results с колонками URLMetadata и дополнительной колонкой host, с индексами по статусу, хосту и языку
+    для выборок по ним. Списки хранятся как JSON. Каждый пакет записывается одной транзакцией, поэтому при аварийном
+    завершении .part содержит все строки, кроме последнего неполного пакета.
+    """
+    extension: str = "sqlite3"
+    table: str = "results"
+    key: str = "id"
+    indexes: tuple[str, ...] = ("download_status", "host", "detected_language")
+
+    def _open(self) -> None:
+        types: dict[type, str] = {str: "TEXT", int: "INTEGER", float: "REAL", bool: "INTEGER", list: "TEXT"}
+        columns: list[str] = [
+            f"{name} {types[column]}" + (" PRIMARY KEY" if name == self.key else "")
+            for name, column in REPORT_COLUMNS.items()
+        ]
+
+        self._connection = sqlite3.connect(self.part_path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(f"CREATE TABLE {self.table} ({', '.join(columns)}, host TEXT)")
+            for column in self.indexes:
+                self._connection.execute(f"CREATE INDEX {self.table}_{column} ON {self.table} ({column})")
+
+    def _write_rows(self, rows: list[dict[str, Any]]) -> None:
+        with self._connection:
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO {self.table} ({', '.join(REPORT_COLUMNS)}, host) "
+                f"VALUES ({', '.join('?' for _ in REPORT_COLUMNS)}, ?)",
+                (self._values(row) for row in rows),
+            )
+
+    @staticmethod
+    def _values(row: dict[str, Any]) -> tuple:
+        values: list[Any] = [
+            json.dumps(row[name], ensure_ascii=False) if column is list and row[name] is not None else row[name]
+            for name, column in REPORT_COLUMNS.items()
+        ]
+        return *values, get_host(row["canonical_url"] or row["source_url"] or "")
+
+    def _close(self) -> None:
+        self._connection.close()
+
+
+REPORT_WRITERS: dict[str, type[ReportWriter]] = {
+    "csv": CSVReportWriter,
+    "jsonl": JSONLReportWriter,
+    "parquet": ParquetReportWriter,
+    "sqlite": SQLiteReportWriter,
+}
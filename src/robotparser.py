@@ -1,34 +1,75 @@
 from urllib.parse import urlparse
 from urllib.robotparser import RobotFileParser
-from urllib.error import URLError
 
+import requests
+from requests.exceptions import RequestException
 
-_robots_cache: dict[str, RobotFileParser] = {}
+import http_session
 
 
-def can_fetch(url: str, user_agent: str) -> bool:
+_robots_cache: dict[str, RobotFileParser | None] = {}
+
+
+def _get_robot_parser(url: str) -> RobotFileParser | None:
     """
-    Вспомогательная функция для определения доступа к определенному URL.
-    Проверяет наличие robots.txt на соответствующем домене и определяет доступность по его содержимому, если
-    robots.txt есть.
-    Если robots.txt отсутствует или при попытке обратиться к sitemap/robots.txt получает ошибку, то URL доступен.
-    Также парсеры кэшируются, и при повторной попытке обратиться к URL на том же домене берется предыдущий результат.
+    Парсеры кэшируются, и при повторной попытке обратиться к URL на том же домене берется предыдущий результат, в том
+    числе если robots.txt получить не удалось.
+    robots.txt загружается через общую сессию, поэтому соединение с хостом затем переиспользуется загрузчиком.
+    Коды ответов трактуются как в RFC 9309: 401 и 403 запрещают весь хост, остальные 4xx означают отсутствие
+    ограничений, а 5xx - временную недоступность robots.txt, при которой хост тоже считается запрещенным (как и в
+    RobotFileParser.read). Если не удалось соединиться с хостом, ограничений нет, как и раньше: такой хост все равно
+    не получится скачать.
     """
     parsed_url = urlparse(url)
     sitemap: str = f"{parsed_url.scheme}://{parsed_url.netloc}"
-    robot_parser: RobotFileParser | None = _robots_cache.get(sitemap)
 
-    if not robot_parser:
+    if sitemap not in _robots_cache:
         robots_url: str = sitemap + "/robots.txt"
-        robot_parser = RobotFileParser()
+        robot_parser: RobotFileParser | None = RobotFileParser()
         robot_parser.set_url(robots_url)
 
         try:
-            robot_parser.read()
-        except URLError:
+            response: requests.Response = http_session.get_session().get(robots_url, timeout=5)
+        except RequestException:
             robot_parser = None
+        else:
+            if response.status_code in (401, 403) or response.status_code >= 500:
+                robot_parser.disallow_all = True
+            elif 400 <= response.status_code < 500:
+                robot_parser.allow_all = True
+            else:
+                robot_parser.parse(response.content.decode("utf-8", errors="replace").splitlines())
         _robots_cache[sitemap] = robot_parser
+    return _robots_cache[sitemap]
+
+
+def can_fetch(url: str, user_agent: str) -> bool:
+    """
+    Вспомогательная функция для определения доступа к определенному URL.
+    Проверяет наличие robots.txt на соответствующем домене и определяет доступность по его содержимому, если
+    robots.txt есть.
+    Если robots.txt отсутствует или к хосту не удалось подключиться, то URL доступен. Если сервер ответил на запрос
+    robots.txt ошибкой 5xx, URL недоступен.
+    """
+    robot_parser: RobotFileParser | None = _get_robot_parser(url)
     if robot_parser is None:
         return True
 
     return robot_parser.can_fetch(url=url, useragent=user_agent)
+
+
+def request_interval(url: str, user_agent: str) -> float | None:
+    """
+    Минимальный интервал между запросами к хосту в секундах по директивам Crawl-delay и Request-rate.
+    Если указаны обе директивы, берется более строгая. Если ни одной нет, возвращается None.
+    """
+    robot_parser: RobotFileParser | None = _get_robot_parser(url)
+    if robot_parser is None:
+        return None
+
+    intervals: list[float] = []
+    if (crawl_delay := robot_parser.crawl_delay(user_agent)) is not None:
+        intervals.append(float(crawl_delay))
+    if (request_rate := robot_parser.request_rate(user_agent)) is not None and request_rate.requests:
+        intervals.append(request_rate.seconds / request_rate.requests)
+    return max(intervals) if intervals else None
@@ -0,0 +1,225 @@
+from concurrent.futures import Future
+from multiprocessing.connection import (
+    Connection,
+    wait,
+)
+from typing import Callable
+import logging
+import queue
+import threading
+import time
+
+import psutil
+
+from mp_context import get_mp_context
+
+
+class WorkerLimitExceeded(Exception):
+    pass
+
+
+def _worker_main(connection: Connection, initializer: Callable[[], None] | None) -> None:
+    """
+    Цикл процесса-обработчика: получает задачу, выполняет ее и отправляет результат обратно. None завершает процесс.
+    """
+    if initializer is not None:
+        initializer()
+    while (task := connection.recv()) is not None:
+        fn, args = task
+        try:
+            connection.send((True, fn(*args)))
+        except Exception as e:
+            connection.send((False, f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, context, initializer: Callable[[], None] | None):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_connection, initializer))
+        self.process.start()
+        child_connection.close()
+        self.future: Future | None = None
+        self.started: float = 0.0
+        self.cpu_started: float = 0.0
+
+    def processes(self) -> list[psutil.Process]:
+        """
+        Процесс обработчика вместе с дочерними: PDFHandler может запускать свои процессы для больших файлов.
+        """
+        try:
+            process = psutil.Process(self.process.pid)
+            return [process, *process.children(recursive=True)]
+        except psutil.Error:
+            return []
+
+    def cpu_time(self) -> float:
+        cpu_time: float = 0.0
+        for process in self.processes():
+            try:
+                cpu_times = process.cpu_times()
+                cpu_time += cpu_times.user + cpu_times.system
+            except psutil.Error:
+                continue
+        return cpu_time
+
+    def memory_mb(self) -> float:
+        rss: int = 0
+        for process in self.processes():
+            try:
+                rss += process.memory_info().rss
+            except psutil.Error:
+                continue
+        return rss / (1024 * 1024)
+
+    def kill(self) -> None:
+        for process in reversed(self.processes()):
+            try:
+                process.kill()
+            except psutil.Error:
+                continue
+        self.process.join()
+        self.connection.close()
+
+
+class SandboxPool:
+    """
+    Пул процессов-обработчиков с ограничениями на каждую задачу: wall_timeout - время выполнения в секундах,
+    cpu_limit - процессорное время в секундах, memory_limit_mb - суммарный RSS процесса и его дочерних процессов.
+
+    В отличие от ProcessPoolExecutor, процесс, превысивший ограничение, принудительно завершается вместе с дочерними
+    процессами и заменяется новым, а future задачи завершается исключением WorkerLimitExceeded с причиной. Так один
+    испорченный файл, на котором библиотека зацикливается или неограниченно расходует память, не останавливает
+    обработку остальных.
+
+    Ограничения проверяются фоновым потоком каждые poll_interval секунд. Каждый процесс выполняет одну задачу за
+    раз, поэтому расход ресурсов процесса относится к конкретной задаче.
+    """
+    def __init__(
+        self,
+        workers: int,
+        *,
+        initializer: Callable[[], None] | None = None,
+        wall_timeout: float | None = None,
+        cpu_limit: float | None = None,
+        memory_limit_mb: float | None = None,
+        poll_interval: float = 0.1,
+    ):
+        self.initializer: Callable[[], None] | None = initializer
+        self.wall_timeout: float | None = wall_timeout
+        self.cpu_limit: float | None = cpu_limit
+        self.memory_limit_mb: float | None = memory_limit_mb
+        self.poll_interval: float = poll_interval
+        self._context = get_mp_context()
+        self._tasks: queue.Queue = queue.Queue()
+        self._closed = threading.Event()
+        self._workers: list[_Worker] = [_Worker(self._context, initializer) for _ in range(workers)]
+        self._monitor = threading.Thread(target=self._run, name="sandbox-monitor", daemon=True)
+        self._monitor.start()
+
+    def submit(self, fn: Callable, *args) -> Future:
+        if self._closed.is_set():
+            raise RuntimeError("Cannot submit to a closed pool")
+        future: Future = Future()
+        self._tasks.put((future, fn, args))
+        return future
+
+    def close(self) -> None:
+        """
+        Задачи, которые еще не начали выполняться, отменяются, а выполняющиеся прерываются.
+        """
+        self._closed.set()
+        self._monitor.join()
+        while True:
+            try:
+                future, _, _ = self._tasks.get_nowait()
+            except queue.Empty:
+                break
+            future.cancel()
+        for worker in self._workers:
+            if worker.future is not None:
+                worker.kill()
+                worker.future.set_exception(WorkerLimitExceeded("Pool closed"))
+            else:
+                try:
+                    worker.connection.send(None)
+                except OSError:
+                    pass
+                worker.process.join()
+                worker.connection.close()
+
+    def _run(self) -> None:
+        while not self._closed.is_set():
+            for worker in list(self._workers):
+                if worker.future is None:
+                    if not worker.process.is_alive():
+                        logging.warning(
+                            f"Replacing handler worker {worker.process.pid}: exited with code {worker.process.exitcode}"
+                        )
+                        worker = self._replace(worker)
+                    self._assign(worker)
+
+            busy: list[_Worker] = [worker for worker in self._workers if worker.future is not None]
+            if not busy:
+                time.sleep(self.poll_interval)
+                continue
+            wait(
+                [worker.connection for worker in busy] + [worker.process.sentinel for worker in busy],
+                timeout=self.poll_interval,
+            )
+            for worker in busy:
+                self._check(worker)
+
+    def _assign(self, worker: _Worker) -> None:
+        try:
+            future, fn, args = self._tasks.get_nowait()
+        except queue.Empty:
+            return
+        if not future.set_running_or_notify_cancel():
+            return
+        worker.future = future
+        worker.started = time.monotonic()
+        worker.cpu_started = worker.cpu_time()
+        try:
+            worker.connection.send((fn, args))
+        except Exception as e:
+            worker.future = None
+            future.set_exception(e)
+
+    def _check(self, worker: _Worker) -> None:
+        if worker.connection.poll():
+            try:
+                success, value = worker.connection.recv()
+            except (EOFError, OSError):
+                pass
+            else:
+                future, worker.future = worker.future, None
+                if success:
+                    future.set_result(value)
+                else:
+                    future.set_exception(Exception(value))
+                return
+
+        if not worker.process.is_alive():
+            reason: str = f"Worker exited with code {worker.process.exitcode}"
+        elif self.wall_timeout is not None and time.monotonic() - worker.started > self.wall_timeout:
+            reason = f"Wall-clock limit of {self.wall_timeout} s exceeded"
+        elif self.cpu_limit is not None and worker.cpu_time() - worker.cpu_started > self.cpu_limit:
+            reason = f"CPU time limit of {self.cpu_limit} s exceeded"
+        elif self.memory_limit_mb is not None and worker.memory_mb() > self.memory_limit_mb:
+            reason = f"Memory limit of {self.memory_limit_mb} MB exceeded"
+        else:
+            return
+
+        logging.warning(f"Replacing handler worker {worker.process.pid}: {reason}")
+        future: Future = worker.future
+        self._replace(worker)
+        future.set_exception(WorkerLimitExceeded(reason))
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        """
+        Процесс завершается вместе с дочерними, если он еще жив, и заменяется новым.
+        """
+        worker.kill()
+        new_worker: _Worker = _Worker(self._context, self.initializer)
+        self._workers[self._workers.index(worker)] = new_worker
+        return new_worker
@@ -0,0 +1,153 @@
+from collections import (
+    OrderedDict,
+    deque,
+)
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+    wait,
+    FIRST_COMPLETED,
+)
+from typing import (
+    Callable,
+    Iterable,
+    Iterator,
+    TypeVar,
+)
+from urllib.parse import urlparse
+import asyncio
+import logging
+
+
+T = TypeVar("T")
+
+
+def get_host(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+class AsyncSlots:
+    """
+    Семафор, который захватывается в цикле событий, а освобождается из любого потока. Ожидание слота не занимает
+    потоки пула цикла событий, в отличие от ожидания threading.Semaphore через asyncio.to_thread.
+
+    Цикл событий запоминается при первом acquire, поэтому объект можно создать до его запуска. После завершения
+    цикла release ничего не делает.
+    """
+    def __init__(self, value: int):
+        self.value: int = value
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+    async def acquire(self, timeout: float | None = None) -> bool:
+        """
+        Возвращает False, если слот не освободился за timeout секунд.
+        """
+        if self._semaphore is None:
+            self._loop = asyncio.get_running_loop()
+            self._semaphore = asyncio.Semaphore(self.value)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def release(self) -> None:
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._semaphore.release)
+        except RuntimeError:
+            """
+            Цикл событий закрылся между проверкой и вызовом.
+            """
+            pass
+
+
+class DownloadScheduler:
+    """
+    Планировщик задач с глобальным ограничением количества потоков и ограничением параллельных задач на один хост.
+
+    Задачи раскладываются по очередям хостов, а раздача идет по кругу (round-robin) только тем хостам, у которых
+    есть свободный слот. Поток никогда не простаивает в ожидании слота конкретного хоста, поэтому один медленный
+    хост занимает не больше per_host_limit потоков и не мешает остальным.
+
+    Задачи читаются из items лениво: в очередях хостов одновременно находится не больше lookahead задач, поэтому
+    items может быть генератором произвольной длины. lookahead должен быть достаточно большим, чтобы в окне
+    оказались разные хосты, даже если входные данные отсортированы по хосту.
+    """
+    def __init__(
+        self,
+        *,
+        workers: int = 16,
+        per_host_limit: int = 2,
+        lookahead: int = 10_000,
+    ):
+        if workers < 1 or per_host_limit < 1 or lookahead < 1:
+            raise ValueError("workers, per_host_limit and lookahead must be positive")
+        self.workers: int = workers
+        self.per_host_limit: int = per_host_limit
+        self.lookahead: int = lookahead
+
+    def run(
+        self,
+        items: Iterable[T],
+        task: Callable[[T], None],
+        *,
+        key: Callable[[T], str],
+    ) -> None:
+        items: Iterator[T] = iter(items)
+        exhausted: bool = False
+        queued: int = 0
+        queues: OrderedDict[str, deque[T]] = OrderedDict()
+        in_flight: dict[Future, str] = {}
+        host_load: dict[str, int] = {}
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                while not exhausted and queued < self.lookahead:
+                    try:
+                        item: T = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    queues.setdefault(key(item), deque()).append(item)
+                    queued += 1
+                if not (queues or in_flight):
+                    break
+
+                """
+                Проходы по кругу повторяются, пока есть свободные потоки и хосты со свободными слотами: за один проход
+                каждый хост получает не больше одной задачи, так что иначе хост не получил бы больше одного потока.
+                """
+                submitted: bool = True
+                while submitted and len(in_flight) < self.workers:
+                    submitted = False
+                    for host in list(queues.keys()):
+                        if len(in_flight) >= self.workers:
+                            break
+                        if host_load.get(host, 0) >= self.per_host_limit:
+                            continue
+
+                        host_queue: deque[T] = queues.pop(host)
+                        future: Future = executor.submit(task, host_queue.popleft())
+                        queued -= 1
+                        in_flight[future] = host
+                        host_load[host] = host_load.get(host, 0) + 1
+                        submitted = True
+                        """
+                        Хост с оставшимися задачами переставляется в конец очереди, так достигается круговая раздача.
+                        """
+                        if host_queue:
+                            queues[host] = host_queue
+
+                if not in_flight:
+                    continue
+                done, _ = wait(in_flight.keys(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    host: str = in_flight.pop(future)
+                    host_load[host] -= 1
+                    if not host_load[host]:
+                        del host_load[host]
+                    if exception := future.exception():
+                        logging.error(f"Scheduled task for {host} failed: {exception}")
@@ -0,0 +1,61 @@
+from dataclasses import (
+    astuple,
+    fields,
+)
+from pathlib import Path
+from typing import (
+    Generic,
+    TypeVar,
+)
+import sqlite3
+import threading
+
+
+T = TypeVar("T")
+
+
+class SQLiteStore(Generic[T]):
+    """
+    Простое персистентное хранилище датаклассов "ключ - запись" в SQLite. Записи сохраняются сразу, поэтому не
+    теряются при аварийном завершении программы. Соединение общее для всех потоков и защищено блокировкой.
+
+    Колонки таблицы совпадают с полями датакласса. Если в датакласс добавили новое поле, колонка добавляется в уже
+    существующую таблицу при открытии.
+    """
+    table: str
+    key: str
+    entry_class: type[T]
+
+    def __init__(self, file_path: str):
+        Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(file_path, check_same_thread=False, isolation_level=None)
+        self._columns: list[str] = [entry_field.name for entry_field in fields(self.entry_class)]
+
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ({self.key} TEXT PRIMARY KEY, {', '.join(self._columns)})"
+        )
+        existing_columns: set[str] = {row[1] for row in self._connection.execute(f"PRAGMA table_info({self.table})")}
+        for column in self._columns:
+            if column not in existing_columns:
+                self._connection.execute(f"ALTER TABLE {self.table} ADD COLUMN {column}")
+
+    def get(self, key: str) -> T | None:
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT {', '.join(self._columns)} FROM {self.table} WHERE {self.key} = ?",
+                (key,),
+            ).fetchone()
+        return self.entry_class(**dict(zip(self._columns, row))) if row else None
+
+    def put(self, key: str, entry: T) -> None:
+        with self._lock:
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO {self.table} ({self.key}, {', '.join(self._columns)}) "
+                f"VALUES (?, {', '.join('?' for _ in self._columns)})",
+                (key, *astuple(entry)),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()